@@ -0,0 +1,103 @@
+import os
+import csv
+import sys
+import json
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from fishrespy import RawFileParse, MO2Calculate, check_start_time, check_start_date, check_cycle_time
+
+log = logging.getLogger('batchRun')
+
+HEADER = ['file', 'cycle'] + MO2Calculate.COLUMNS
+
+def parse_cycle_time(value):
+    """Returns cycle_time as (minutes, seconds) from 'min:sec' string or 2 value list"""
+    if isinstance(value, str):
+        return check_cycle_time(value.strip())
+    return check_cycle_time('%d:%d' % tuple(value))
+
+def read_manifest(file):
+    """
+    Reads a manifest of experiments from a .csv (with header) or .json (list of
+    objects) file.  Each entry needs file, start_time, start_date, cycle_time
+    ('min:sec'), mass and volume, and may have fish and chamber (used by
+    resultsStore.py).  Relative file paths are taken from the directory of
+    the manifest.  Returns list of dicts.
+    """
+    with open(file, 'r') as f:
+        if file.lower().endswith('.json'):
+            entries = json.load(f)
+        else:
+            entries = list(csv.DictReader(f))
+    folder = os.path.dirname(os.path.abspath(file))
+    manifest = []
+    for entry in entries:
+        manifest.append({'file': os.path.join(folder, entry['file']),
+                         'start_time': check_start_time(entry['start_time'].strip()),
+                         'start_date': check_start_date(entry['start_date'].strip()),
+                         'cycle_time': parse_cycle_time(entry['cycle_time']),
+                         'mass': float(entry['mass']),
+                         'volume': float(entry['volume']),
+                         'fish': entry.get('fish') or None,
+                         'chamber': entry.get('chamber') or None})
+    return manifest
+
+def run_one(entry):
+    """Parse and calculate MO2 for one manifest entry, returns list of result rows"""
+    data = RawFileParse(entry['file'], entry['start_time'], entry['start_date'], entry['cycle_time']).get_data()
+    output = MO2Calculate(data, entry['mass'], entry['volume'], entry['cycle_time']).get_data()
+    return [[entry['file'], key] + output[key] for key in output]
+
+def try_one(entry):
+    """run_one() which returns the rows and None, or no rows and the error if entry fails"""
+    try:
+        return run_one(entry), None
+    except Exception as e:
+        return [], '%s: %s' % (type(e).__name__, e)
+
+def run_batch(manifest, workers = None):
+    """
+    Runs every entry of manifest in a pool of worker processes (default one per
+    core).  Returns combined list of result rows in manifest order, each row
+    starting with the raw file and cycle count it came from.  An entry which
+    fails (missing or truncated file, bad date) gives no rows and the rest
+    carry on, its error is logged and kept in the entry under 'error'.
+    """
+    if workers == 1:
+        results = map(try_one, manifest)
+    else:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            results = list(pool.map(try_one, manifest))
+    rows = []
+    for entry, (result, error) in zip(manifest, results):
+        entry['error'] = error
+        if error is not None:
+            log.error('%s: %s', entry['file'], error)
+        rows.extend(result)
+    return rows
+
+def save_results(rows, file):
+    """Writes combined result rows to .csv file with header"""
+    with open(file, 'w', newline = '') as f:
+        w = csv.writer(f)
+        w.writerow(HEADER)
+        w.writerows(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Calculate MO2 for many raw files in parallel')
+    parser.add_argument('manifest', help = '.csv or .json with file, start_time, start_date, '
+                                           'cycle_time, mass and volume for each raw file')
+    parser.add_argument('output', help = 'combined results .csv')
+    parser.add_argument('-w', '--workers', type = int, default = None,
+                        help = 'number of worker processes (default one per core)')
+    args = parser.parse_args()
+    logging.basicConfig(format = '%(levelname)s %(message)s')
+    manifest = read_manifest(args.manifest)
+    save_results(run_batch(manifest, args.workers), args.output)
+    #results of the other files are saved, exit status shows some failed
+    if any(entry['error'] for entry in manifest):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from numpy import arange, diff, repeat
+from fishrespy import RawFileParse, MO2Calculate
+from synthData import write_raw
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+START_TIME, START_DATE, CYCLE_TIME = '16:38:30', '30/10/13', (10, 0)
+MASS, VOLUME = 0.61, 5
+STAGES = ['parse', 'qc', 'fit', 'save']
+
+def best_time(func, repeats):
+    """Returns shortest wall time (s) of repeats calls to func"""
+    times = []
+    for i in range(repeats):
+        t = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+def peak_rss():
+    """Returns peak resident memory of this process in MB, None if unknown"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #bytes on macOS, kilobytes elsewhere
+    return rss / 1048576. if sys.platform == 'darwin' else rss / 1024.
+
+def run_size(hours, folder, repeats, seed = 0):
+    """
+    Writes a synthetic raw file of hours length and times each stage of the
+    pipeline on it.  Returns dict of stage mapped to time (s), samples and
+    throughput (samples/s), plus peak RSS (MB) of the process.
+    """
+    file = os.path.join(folder, 'raw_%gh.txt' % hours)
+    lines = write_raw(file, hours, start = START_DATE + ' ' + START_TIME, cycle_time = CYCLE_TIME, seed = seed)
+
+    parser = RawFileParse(file, START_TIME, START_DATE, CYCLE_TIME, extract = False)
+    parse = best_time(parser.extract_data, repeats)
+    data = parser.extract_data()
+    calc = MO2Calculate(data, MASS, VOLUME, CYCLE_TIME)
+
+    counts = diff(data.offsets)
+    cycle = repeat(arange(len(data)), counts)
+    seconds = data.epoch - repeat(data.epoch[data.offsets[:-1]], counts)
+    qc = best_time(lambda: calc.fill_gaps_all(cycle, seconds, data.O2, len(data)), repeats)
+    fit = best_time(lambda: calc.fit_slopes(calc.qc_O2), repeats)
+    save = best_time(lambda: calc.save_data(os.path.join(folder, 'results_%gh.csv' % hours)), repeats)
+
+    result = {'hours': hours, 'cycles': len(data), 'peak_rss': peak_rss()}
+    samples = {'parse': lines, 'qc': len(data.epoch), 'fit': calc.qc_O2.size, 'save': len(data)}
+    for stage, t in zip(STAGES, [parse, qc, fit, save]):
+        result[stage] = {'time': t, 'samples': samples[stage], 'throughput': samples[stage] / t if t else None}
+    return result
+
+def run(sizes, repeats):
+    """
+    Runs run_size() for each length in sizes (hours), each in a fresh process
+    so peak RSS belongs to that size only.  Returns list of results.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for hours in sizes:
+            with ProcessPoolExecutor(max_workers = 1) as pool:
+                results.append(pool.submit(run_size, hours, folder, repeats).result())
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Compares throughput of each stage and size with a baseline from an earlier
+    run.  Returns list of messages for each stage slower than baseline by more
+    than tolerance (fraction).
+    """
+    old = {r['hours']: r for r in baseline}
+    slower = []
+    for r in results:
+        if r['hours'] not in old:
+            continue
+        for stage in STAGES:
+            now, before = r[stage]['throughput'], old[r['hours']][stage]['throughput']
+            if now and before and now < before * (1 - tolerance):
+                slower.append('%gh %s: %.0f samples/s, baseline %.0f (%.0f%% slower)'
+                              % (r['hours'], stage, now, before, 100 * (1 - now / before)))
+    return slower
+
+def report(results):
+    """Prints table of throughput for each size and stage"""
+    print('%8s %7s %9s' % ('hours', 'cycles', 'RSS (MB)') + ''.join('%16s' % (s + ' (S/s)') for s in STAGES))
+    for r in results:
+        rss = '%9.0f' % r['peak_rss'] if r['peak_rss'] is not None else '%9s' % '-'
+        print('%8g %7d ' % (r['hours'], r['cycles']) + rss +
+              ''.join('%16.3g' % (r[s]['throughput'] or 0) for s in STAGES))
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark parse, QC, fit and save stages on synthetic raw files')
+    parser.add_argument('--hours', type = float, nargs = '+', default = [6, 24, 168],
+                        help = 'lengths of synthetic recordings to time')
+    parser.add_argument('--repeats', type = int, default = 3)
+    parser.add_argument('--baseline', help = '.json results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type = float, default = 0.2,
+                        help = 'fraction slower than baseline reported as a regression')
+    parser.add_argument('--save', help = 'write results to .json (use as a later baseline)')
+    args = parser.parse_args()
+
+    results = run(args.hours, args.repeats)
+    report(results)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent = 1)
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        for message in slower:
+            print('SLOWER ' + message)
+        if slower:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -2,38 +2,58 @@ from tkinter import *
 from tkinter import ttk
 from tkinter import filedialog
 import csv
+import operator
 from datetime import datetime
-import matplotlib.pyplot as plt
 import math
 import numpy as np
+from resultsModel import ResultsModel
 
 class DisplayData:
     """
     Display data in spreadsheet like window.
-    Data format is dictionary of lists, each list refers to
-    one row of data, or list of lists
+    Data format is a ResultsModel (see resultsModel.py), or dictionary of
+    lists, each list refers to one row of data, or list of lists.
+    The table is virtualized: a fixed set of row widgets is filled with
+    whichever rows are scrolled into view, so opening, scrolling, sorting
+    (click a column header) and filtering cost the same for any number of rows.
+    Edits to a cell are written to the model, which recomputes MO2 of that
+    row when its slope, mass or volume changes.  Edit sets mass or volume of
+    a range of rows, and excludes or includes cycles (also right click on a
+    row number); the summary line and any open plots are updated with just
+    the rows changed.
+    With a TraceView (see traceView.py) as trace, Plot > Raw trace shows the
+    raw O2 and temp, and double clicking a row number zooms it to that cycle.
     """
-    def __init__(self, root, data):
+    OPERATORS = {'<': operator.lt, '<=': operator.le, '=': operator.eq,
+                 '!=': operator.ne, '>=': operator.ge, '>': operator.gt}
+
+    def __init__(self, root, data, trace = None):
         self.root = root
+        self.trace = trace
         self.root.title('Results')
         self.root.minsize(550, 620)
         self.root.maxsize(550, 620)
 
-        #Configure canvas
-        self.canvas = Canvas(self.root, width = 530, height = 600)
+        #Configure canvas, scrolls horizontally, rows are scrolled by yview()
+        self.canvas = Canvas(self.root, width = 530, height = 580)
 
         #Configure frame for canvas
         self.canvasFrame = Frame(self.canvas, background = 'black')
         #configure scrollbars
-        self.vscrollbar = ttk.Scrollbar(self.root, orient = 'vertical', command = self.canvas.yview)
+        self.vscrollbar = ttk.Scrollbar(self.root, orient = 'vertical', command = self.yview)
         self.hscrollbar = ttk.Scrollbar(self.root, orient = 'horizontal', command = self.canvas.xview)
 
-        self.canvas.configure(yscrollcommand = self.vscrollbar.set, xscrollcommand = self.hscrollbar.set)
+        self.canvas.configure(xscrollcommand = self.hscrollbar.set)
         self.canvas.grid(row = 0, column = 0)
         self.vscrollbar.grid(row = 0, column = 1, sticky = (N, S))
         self.hscrollbar.grid(row = 1, column = 0, sticky = (W, E))
+        self.summary = StringVar()
+        ttk.Label(self.root, textvariable = self.summary).grid(row = 2, column = 0, sticky = W)
 
         self.canvasFrame.bind('<Configure>', self.onFrameConfigure)
+        self.canvas.bind('<MouseWheel>', self.onMouseWheel)
+        self.canvas.bind('<Button-4>', self.onMouseWheel)
+        self.canvas.bind('<Button-5>', self.onMouseWheel)
 
         self.dataFrame = Frame(self.canvasFrame, background = 'black')
         self.dataFrame.grid(column = 1, row = 1)
@@ -42,14 +62,31 @@ class DisplayData:
 
         self.canvas.create_window((0, 0), window = self.canvasFrame, anchor = 'nw')
 
-        #create header labels, configure to generate default header
-        self.header = ['','slope','R2','start','MO2','mass', 'meanTemp', 'sdTemp']
-
         #data components
         self.data = data
-        self.nrows = len(data)
-        self.ncols = len(data[0])
+        if not isinstance(data, ResultsModel):
+            data = ResultsModel(list(data.values()) if isinstance(data, dict) else list(data))
+        self.model = data
+        self.model.subscribe(self.on_change)
+        self.nrows = len(self.model)
+        self.ncols = len(self.model.columns)
+        #open plots updated by on_change(), see plot_ts() and plot_hist()
+        self.ts = None
+        self.hist = None
+
+        #create header labels from the columns of the model
+        self.header = [''] + self.model.columns
+        #rows in display order after sort and filter, sorted is every row
+        self.sorted = list(range(self.nrows))
+        self.order = self.sorted
+        self.sort_column, self.descending = None, False
+        self.keep = None
+        self.top = 0
+        self.visible = 25
+        #(widget row, column, data row) of the cell with focus, see start_edit()
+        self.editing = None
         self.widgets = []
+        self.row_labels = []
         self.cell_vals = {}
         self.cell_width = 10
 
@@ -57,41 +94,289 @@ class DisplayData:
         self.createRowLabels()
         self.createCells()
         self.createMenu()
+        self.refresh()
+        self.show_summary()
 
     def onFrameConfigure(self, event):
         self.canvas.configure(scrollregion = self.canvas.bbox('all'))
 
+    def onMouseWheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.yview('scroll', -3, 'units')
+        else:
+            self.yview('scroll', 3, 'units')
+
     def createHeader(self):
         for c in range(len(self.header)):
-            label = ttk.Label(self.headerFrame, text = self.header[c], width = self.cell_width)
+            if c == 0:
+                label = ttk.Label(self.headerFrame, text = self.header[c], width = self.cell_width)
+            else:
+                label = ttk.Button(self.headerFrame, text = self.header[c], width = self.cell_width,
+                                   command = lambda c = c - 1: self.sort_by(c))
             label.grid(row = 0, column = c + 1, padx = 1, pady = 1)
 
     def createRowLabels(self):
-        for r in range(self.nrows):
-            label = ttk.Label(self.dataFrame, text = str(r + 1), width = self.cell_width)
-            label.grid(row = r, column = 0, padx = 1, pady = 1)
+        for i in range(self.visible):
+            label = ttk.Label(self.dataFrame, text = '', width = self.cell_width)
+            label.grid(row = i, column = 0, padx = 1, pady = 1)
+            label.bind('<MouseWheel>', self.onMouseWheel)
+            label.bind('<Button-4>', self.onMouseWheel)
+            label.bind('<Button-5>', self.onMouseWheel)
+            label.bind('<Double-Button-1>', lambda e, i = i: self.plot_trace(i))
+            label.bind('<Button-3>', lambda e, i = i: self.toggle_row(i))
+            self.row_labels.append(label)
 
     def createCells(self):
-        for r in range(self.nrows):
+        for i in range(self.visible):
             curr_row = []
             for c in range(self.ncols):
-                self.cell_vals[str(r) + str(c)] = DoubleVar()
-                self.cell_vals[str(r) + str(c)].set(self.data[r][c])
-                entry = ttk.Entry(self.dataFrame, width = self.cell_width, textvariable = self.cell_vals[str(r) + str(c)])
-                entry.grid(row = r, column = c + 1)
+                var = StringVar()
+                self.cell_vals[(i, c)] = var
+                entry = ttk.Entry(self.dataFrame, width = self.cell_width, textvariable = var)
+                entry.grid(row = i, column = c + 1)
+                entry.bind('<Return>', lambda e, i = i, c = c: self.commit(i, c))
+                entry.bind('<FocusOut>', lambda e, i = i, c = c: self.end_edit(i, c))
+                entry.bind('<FocusIn>', lambda e, i = i, c = c: self.start_edit(i, c))
+                entry.bind('<MouseWheel>', self.onMouseWheel)
+                entry.bind('<Button-4>', self.onMouseWheel)
+                entry.bind('<Button-5>', self.onMouseWheel)
                 curr_row.append(entry)
             self.widgets.append(curr_row)
 
+    def refresh(self):
+        """
+        Fill the row widgets with the rows scrolled into view.  A cell being
+        edited is committed first, as the row it shows may change.
+        """
+        editing = self.editing
+        if editing is not None:
+            self.editing = None
+            self.commit_row(*editing)
+        for i in range(self.visible):
+            pos = self.top + i
+            if pos < len(self.order):
+                r = self.order[pos]
+                #excluded rows are numbered in brackets
+                self.row_labels[i].configure(text = str(r + 1) if self.model.included[r] else '(%d)' % (r + 1))
+                for c in range(self.ncols):
+                    self.cell_vals[(i, c)].set(str(self.model.get(r, self.header[c + 1])))
+                    self.widgets[i][c].configure(state = 'normal')
+            else:
+                self.row_labels[i].configure(text = '')
+                for c in range(self.ncols):
+                    self.cell_vals[(i, c)].set('')
+                    self.widgets[i][c].configure(state = 'disabled')
+        n = max(len(self.order), 1)
+        self.vscrollbar.set(self.top / n, min(self.top + self.visible, n) / n)
+        if editing is not None:
+            #the focused cell now edits whichever row it shows
+            self.start_edit(*editing[:2])
+
+    def yview(self, *args):
+        """Scrollbar command, moves the first row in view"""
+        if args[0] == 'moveto':
+            top = int(float(args[1]) * len(self.order))
+        elif args[2] == 'pages':
+            top = self.top + int(args[1]) * self.visible
+        else:
+            top = self.top + int(args[1])
+        top = max(0, min(top, len(self.order) - self.visible))
+        if top != self.top:
+            self.top = top
+            self.refresh()
+
+    def start_edit(self, i, c):
+        """Records the data row shown in widget row i when the cell gets focus"""
+        pos = self.top + i
+        self.editing = (i, c, self.order[pos]) if pos < len(self.order) else None
+
+    def commit(self, i, c):
+        """Write an edited cell to the model, a cell which cannot be set is put back"""
+        if self.editing is not None and self.editing[:2] == (i, c):
+            r = self.editing[2]
+        else:
+            pos = self.top + i
+            if pos >= len(self.order):
+                return
+            r = self.order[pos]
+        self.commit_row(i, c, r)
+
+    def end_edit(self, i, c):
+        """Commits the cell when it loses focus"""
+        self.commit(i, c)
+        self.editing = None
+
+    def commit_row(self, i, c, r):
+        """Write cell c of widget row i to data row r"""
+        name = self.header[c + 1]
+        text = self.cell_vals[(i, c)].get()
+        if text == str(self.model.get(r, name)):
+            return
+        try:
+            self.model.set(name, r, float(text) if self.model.column(name).dtype == float else text)
+        except ValueError:
+            self.refresh()
+
+    def on_change(self, columns, rows):
+        """Called by the model after each edit with the columns and rows changed"""
+        self.refresh()
+        self.show_summary()
+        if self.ts is None and self.hist is None:
+            return
+        import matplotlib.pyplot as plt
+        if self.ts is not None and plt.fignum_exists(self.ts[0].number):
+            fig, lines = self.ts
+            for name, (line, y) in lines.items():
+                if name in columns or 'included' in columns:
+                    y[rows] = self.model.masked(name, rows)
+                    line.set_ydata(y)
+            fig.canvas.draw_idle()
+        if self.hist is not None and plt.fignum_exists(self.hist[0].number):
+            fig, axes = self.hist
+            for name, (ax, xlabel) in axes.items():
+                if name in columns or 'included' in columns:
+                    ax.cla()
+                    self.set_hist(ax, self.included_values(name), xlabel)
+            fig.canvas.draw_idle()
+
+    def show_summary(self):
+        s = self.model.summary()
+        if 'MO2' in s:
+            self.summary.set('%d of %d cycles   MO2 %.3f (sd %.3f)   temp %.3f' %
+                             (s['included'], s['cycles'], s['MO2'], s['sdMO2'], s.get('meanTemp', float('nan'))))
+
+    def toggle_row(self, i):
+        """Excludes the row at position i of the table, or includes it again if excluded"""
+        if self.top + i < len(self.order):
+            r = self.order[self.top + i]
+            self.model.set_included(r, not self.model.included[r])
+
+    def parse_rows(self, text):
+        """Returns row indices of text such as '1-20, 25' (row numbers), every shown row if blank"""
+        if not text.strip():
+            return list(self.order)
+        rows = []
+        for part in text.split(','):
+            first, _, last = part.partition('-')
+            first = int(first)
+            last = int(last) if last.strip() else first
+            if not 1 <= first <= last <= self.nrows:
+                raise ValueError(part)
+            rows.extend(range(first - 1, last))
+        return rows
+
+    def rows_dialog(self, title, action, value = False):
+        """Popup asking for rows (and a value if value is True), then calls action(rows) or action(rows, value)"""
+        popup = Toplevel(self.root)
+        popup.title(title)
+        rows = StringVar()
+        number = StringVar()
+        ttk.Label(popup, text = 'Rows (e.g. 1-20, 25; blank for all shown)').grid(row = 0, column = 0, sticky = W)
+        ttk.Entry(popup, textvariable = rows, width = 20).grid(row = 0, column = 1)
+        if value:
+            ttk.Label(popup, text = 'Value').grid(row = 1, column = 0, sticky = W)
+            ttk.Entry(popup, textvariable = number, width = 20).grid(row = 1, column = 1)
+
+        def apply():
+            try:
+                if value:
+                    action(self.parse_rows(rows.get()), float(number.get()))
+                else:
+                    action(self.parse_rows(rows.get()))
+            except ValueError:
+                return
+            popup.destroy()
+        ttk.Button(popup, text = 'Apply', command = apply).grid(row = 2, column = 1)
+
+    def column(self, c):
+        """Returns array of sortable values of column c for every row"""
+        values = self.model.column(self.header[c + 1]).tolist()
+        try:
+            return np.array(values, dtype = float)
+        except (TypeError, ValueError):
+            try:
+                return np.array([datetime.strptime(v, '%d/%m/%y %H:%M:%S') for v in values])
+            except (TypeError, ValueError):
+                return np.array([str(v) for v in values])
+
+    def sort_by(self, c):
+        """Sort rows by column c, descending if sorted by c already"""
+        self.descending = not self.descending if self.sort_column == c else False
+        self.sort_column = c
+        order = np.argsort(self.column(c), kind = 'stable')
+        self.sorted = (order[::-1] if self.descending else order).tolist()
+        self.apply_filter()
+
+    def filter_rows(self, c, op, value):
+        """Show only rows where column c compared with op ('<', '=', ...) to value is true"""
+        test = self.OPERATORS[op]
+        values = self.column(c)
+        if values.dtype == float:
+            value = float(value)
+        elif values.dtype == object:
+            value = datetime.strptime(value, '%d/%m/%y %H:%M:%S')
+        self.keep = test(values, value)
+        self.apply_filter()
+
+    def clear_filter(self):
+        self.keep = None
+        self.apply_filter()
+
+    def apply_filter(self):
+        if self.keep is None:
+            self.order = self.sorted
+        else:
+            self.order = [r for r in self.sorted if self.keep[r]]
+        self.top = 0
+        self.refresh()
+
+    def filter_dialog(self):
+        """Popup to choose column, comparison and value for filter_rows()"""
+        popup = Toplevel(self.root)
+        popup.title('Filter')
+        column = StringVar(value = self.header[2])
+        op = StringVar(value = '>=')
+        value = StringVar()
+        ttk.Combobox(popup, textvariable = column, values = self.header[1:], width = self.cell_width,
+                     state = 'readonly').grid(row = 0, column = 0)
+        ttk.Combobox(popup, textvariable = op, values = list(self.OPERATORS), width = 4,
+                     state = 'readonly').grid(row = 0, column = 1)
+        ttk.Entry(popup, textvariable = value, width = self.cell_width).grid(row = 0, column = 2)
+
+        def apply():
+            try:
+                self.filter_rows(self.header.index(column.get()) - 1, op.get(), value.get())
+            except ValueError:
+                return
+            popup.destroy()
+        ttk.Button(popup, text = 'Apply', command = apply).grid(row = 1, column = 2)
+
     def createMenu(self):
         menubar = Menu(self.root)
         menufile = Menu(menubar)
+        menuview = Menu(menubar)
         menuplot = Menu(menubar)
+        menuedit = Menu(menubar)
         menubar.add_cascade(menu = menufile, label = 'File')
+        menubar.add_cascade(menu = menuedit, label = 'Edit')
+        menubar.add_cascade(menu = menuview, label = 'View')
         menubar.add_cascade(menu = menuplot, label = 'Plot')
         menufile.add_command(label = 'Save', command = self.save_file)
         menufile.add_command(label = 'Close', command = self.close_file)
+        menuedit.add_command(label = 'Set mass...', command = lambda: self.rows_dialog(
+            'Set mass', lambda rows, v: self.model.set('mass', rows, v), value = True))
+        menuedit.add_command(label = 'Set volume...', command = lambda: self.rows_dialog(
+            'Set volume', lambda rows, v: self.model.set('volume', rows, v), value = True))
+        menuedit.add_command(label = 'Exclude cycles...', command = lambda: self.rows_dialog(
+            'Exclude cycles', lambda rows: self.model.set_included(rows, False)))
+        menuedit.add_command(label = 'Include cycles...', command = lambda: self.rows_dialog(
+            'Include cycles', lambda rows: self.model.set_included(rows, True)))
+        menuview.add_command(label = 'Filter...', command = self.filter_dialog)
+        menuview.add_command(label = 'Clear filter', command = self.clear_filter)
         menuplot.add_command(label = 'Timeseries', command = self.plot_ts)
         menuplot.add_command(label = 'Histogram', command = self.plot_hist)
+        if self.trace is not None:
+            menuplot.add_command(label = 'Raw trace', command = self.plot_trace)
         self.root.config(menu = menubar)
 
     def save_file(self):
@@ -107,97 +392,91 @@ class DisplayData:
         """
         with open(file, 'w', newline = '') as f:
             w = csv.writer(f)
-            header = ['slope', 'R2', 'start', 'MO2', 'mass', 'meanTemp', 'sdTemp']
-            w.writerow(header)
-            for row in range(len(self.data)):
-                line = self.data[row]
-                w.writerow(line)
+            w.writerow(self.model.columns + ['included'])
+            for row in range(self.nrows):
+                w.writerow(self.model.row(row) + [int(self.model.included[row])])
 
     def round_up(self, x, base = 50):
             return int(math.ceil(x / float(base)) * base)
 
     def set_ts(self, ax, x, y, label):
-        ax.plot(y, x)
+        line, = ax.plot(y, x)
         ax.set_ylabel(label, fontsize = 10)
+        return line
 
     def plot_ts(self):
-        m = list()
-        d = list()
-        r = list()
-        s = list()
-        t = list()
-        for i in range(len(self.data)):
-            m.append(self.data[i][3])
-            dt = datetime.strptime(self.data[i][2], '%d/%m/%y %H:%M:%S')
-            d.append(dt)
-            r.append(self.data[i][1])
-            s.append(self.data[i][0])
-            t.append(self.data[i][5])
+        """Time series of included cycles, excluded cycles are gaps in the lines"""
+        import matplotlib.pyplot as plt
+        m = self.model.masked('MO2')
+        d = [datetime.strptime(v, '%d/%m/%y %H:%M:%S') for v in self.model.column('start')]
+        r = self.model.masked('R2')
+        s = self.model.masked('slope')
+        t = self.model.masked('meanTemp')
 
         fig = plt.figure()
         fig.subplots_adjust(hspace = 0.8)
 
         ax = fig.add_subplot(411)
-        self.set_ts(ax, m, d, 'MO2\n(mgO2$^{-1}$kg$^{-1}$h)')
-        ax.set_ylim(0, self.round_up(max(m)))
+        lines = {'MO2': (self.set_ts(ax, m, d, 'MO2\n(mgO2$^{-1}$kg$^{-1}$h)'), m)}
+        ax.set_ylim(0, self.round_up(np.nanmax(m)))
 
         bx = fig.add_subplot(412)
-        self.set_ts(bx, r, d, 'R$^2$')
-        bx.set_yticks(np.arange(math.floor(min(r)*100)/100, 1, 0.01))
+        lines['R2'] = (self.set_ts(bx, r, d, 'R$^2$'), r)
+        bx.set_yticks(np.arange(math.floor(np.nanmin(r)*100)/100, 1, 0.01))
 
         cx = fig.add_subplot(413)
-        self.set_ts(cx, s, d, 'Slope')
+        lines['slope'] = (self.set_ts(cx, s, d, 'Slope'), s)
         cx.ticklabel_format(style = 'sci', scilimits = (0,0), axis = 'y')
 
         dx = fig.add_subplot(414)
-        self.set_ts(dx, t, d, 'Temp ($^\circ$C)')
+        lines['meanTemp'] = (self.set_ts(dx, t, d, r'Temp ($^\circ$C)'), t)
         dx.set_xlabel('Time of Day', fontsize = 10)
-        dx.set_ylim(min(t) - 0.5, max(t) + 0.5)
+        dx.set_ylim(np.nanmin(t) - 0.5, np.nanmax(t) + 0.5)
 
+        self.ts = fig, lines
         plt.show()
 
+    def plot_trace(self, i = None):
+        """Shows raw trace, zoomed to the cycle in row i of the table if given"""
+        if self.trace is None:
+            return
+        cycle = None
+        if i is not None:
+            if self.top + i >= len(self.order):
+                return
+            cycle = self.order[self.top + i]
+        self.trace.show(cycle)
+
     def set_hist(self, ax, x, xlabel):
-        bin_size = math.ceil(len(x) / 5)
-        na = max(plt.hist(x, bin_size)[0])
+        bin_size = max(math.ceil(len(x) / 5), 1)
+        na = max(ax.hist(x, bin_size)[0], default = 0)
         ax.set_xlabel(xlabel, fontsize = 10)
         ax.set_yticks(np.arange(0, self.round_up(na, base = 10) + 10, 10))
-        for tick in ax.xaxis.get_major_ticks():
-            tick.label.set_fontsize(10)
-        for tick in ax.yaxis.get_major_ticks():
-            tick.label.set_fontsize(10)
+        ax.tick_params(labelsize = 10)
 
-    def plot_hist(self):
-        m = list()
-        r = list()
-        s = list()
-        t = list()
-        for i in range(len(self.data)):
-            m.append(self.data[i][3])
-            r.append(self.data[i][1])
-            s.append(self.data[i][0])
-            t.append(self.data[i][5])
+    def included_values(self, name):
+        return self.model.column(name)[self.model.included]
 
+    def plot_hist(self):
+        """Histograms of included cycles"""
+        import matplotlib.pyplot as plt
         fig = plt.figure()
         fig.subplots_adjust(hspace = 0.8)
         fig.text(0.05, 0.52, 'Count').set_rotation(90)
 
-        ax = fig.add_subplot(411)
-        self.set_hist(ax, m, 'MO2 (mgO2$^{-1}$kg$^{-1}$h)')
-
-        bx = fig.add_subplot(412)
-        self.set_hist(bx, r, 'R$^2$')
-
-        cx = fig.add_subplot(413)
-        self.set_hist(cx, s, 'Slope')
-
-        dx = fig.add_subplot(414)
-        self.set_hist(dx, t, 'Temp ($^\circ$C)')
+        axes = {}
+        for i, (name, xlabel) in enumerate((('MO2', 'MO2 (mgO2$^{-1}$kg$^{-1}$h)'), ('R2', 'R$^2$'),
+                                            ('slope', 'Slope'), ('meanTemp', r'Temp ($^\circ$C)'))):
+            ax = fig.add_subplot(411 + i)
+            self.set_hist(ax, self.included_values(name), xlabel)
+            axes[name] = ax, xlabel
 
+        self.hist = fig, axes
         plt.show()
 
 def main():
     data = []
-    for i in range(100):
+    for i in range(100000):
         data.append([0]*7)
 
     root = Tk()
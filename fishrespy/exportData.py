@@ -0,0 +1,144 @@
+import os
+import zipfile
+import argparse
+from numpy import arange, asarray, array, diff, dtype, load, repeat, zeros
+from numpy.lib import format as npy_format
+from fishrespy import RawFileParse, MO2Calculate, InputError, check_start_time, check_start_date, check_cycle_time
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+#cycles written at a time, bounds memory used for the gap filled temp
+CHUNK = 256
+
+def summary(calc):
+    """
+    Returns dict of summary column name mapped to array, one value per closed
+    cycle: cycle, start (seconds since 01/01/1970 of the first sample of the
+    close), slope, R2, MO2, mass, meanTemp and sdTemp.
+    """
+    data, output = calc.data, calc.get_data()
+    rows = [output[key] for key in range(len(output))]
+    columns = {'cycle': arange(len(rows)), 'start': data.epoch[data.offsets[:-1]][:len(rows)]}
+    for name, c in (('slope', 0), ('R2', 1), ('MO2', 3), ('mass', 4), ('meanTemp', 5), ('sdTemp', 6)):
+        columns[name] = array([row[c] for row in rows], dtype = float)
+    return columns
+
+def blocks(calc, chunk = CHUNK):
+    """
+    Yields first cycle, gap filled O2 and gap filled temp of every chunk
+    cycles, each a 2-D array with one row per closed cycle and one column per
+    second of the close.  Temp is filled the same way as O2 in qc_O2.
+    """
+    data = calc.data
+    for a in range(0, len(data), chunk):
+        b = min(a + chunk, len(data))
+        i, j = data.offsets[a], data.offsets[b]
+        counts = diff(data.offsets[a:b + 1])
+        cycle = repeat(arange(b - a), counts)
+        seconds = data.epoch[i:j] - repeat(data.epoch[data.offsets[a:b]], counts)
+        yield a, calc.qc_O2[a:b], calc.fill_gaps_all(cycle, seconds, data.tempC[i:j], b - a)[0]
+
+def series_shape(calc):
+    return (len(calc.data), calc.cycle_time[0] * 60 + calc.cycle_time[1])
+
+def write_npy(f, values_dtype, shape, parts):
+    """Writes .npy header for an array of shape, then each array in parts in turn to open file f"""
+    header = {'descr': npy_format.dtype_to_descr(dtype(values_dtype)), 'fortran_order': False, 'shape': shape}
+    npy_format.write_array_header_2_0(f, header)
+    for part in parts:
+        f.write(asarray(part, dtype = values_dtype).tobytes())
+
+def write_columns(calc, open_column, chunk = CHUNK):
+    """Writes every summary and series column through open_column(name), which returns an open binary file"""
+    for name, values in summary(calc).items():
+        with open_column(name) as f:
+            write_npy(f, values.dtype, values.shape, [values])
+    shape = series_shape(calc)
+    with open_column('qc_O2') as f:
+        write_npy(f, float, shape, [calc.qc_O2 if shape[0] else zeros(shape)])
+    with open_column('qc_tempC') as f:
+        write_npy(f, float, shape, (tempC for a, O2, tempC in blocks(calc, chunk)))
+
+def export_npy(calc, folder, chunk = CHUNK):
+    """
+    Writes summary and series columns of calc as one .npy file each in
+    folder.  Load with load_columns(), each column memory mapped.
+    """
+    os.makedirs(folder, exist_ok = True)
+    write_columns(calc, lambda name: open(os.path.join(folder, name + '.npy'), 'wb'), chunk)
+
+def export_npz(calc, file, chunk = CHUNK):
+    """
+    Writes summary and series columns of calc to a single uncompressed .npz
+    file, read with numpy.load() (or load_columns()), which reads each column
+    only when it is looked up.
+    """
+    with zipfile.ZipFile(file, 'w', zipfile.ZIP_STORED, allowZip64 = True) as z:
+        write_columns(calc, lambda name: z.open(name + '.npy', 'w', force_zip64 = True), chunk)
+
+def export_parquet(calc, folder, chunk = CHUNK):
+    """
+    Writes summary.parquet (one row per closed cycle) and series.parquet (one
+    row per second of each close with cycle, second, O2 and temp) in folder,
+    one row group per chunk cycles.  Requires pyarrow.
+    """
+    if pyarrow is None:
+        raise ImportError('Parquet export requires pyarrow')
+    os.makedirs(folder, exist_ok = True)
+    pyarrow.parquet.write_table(pyarrow.table(summary(calc)), os.path.join(folder, 'summary.parquet'))
+    n = series_shape(calc)[1]
+    schema = pyarrow.schema([('cycle', pyarrow.int64()), ('second', pyarrow.int64()),
+                             ('O2', pyarrow.float64()), ('tempC', pyarrow.float64())])
+    with pyarrow.parquet.ParquetWriter(os.path.join(folder, 'series.parquet'), schema) as w:
+        for a, O2, tempC in blocks(calc, chunk):
+            rows = len(O2)
+            w.write_table(pyarrow.table({'cycle': repeat(arange(a, a + rows), n),
+                                         'second': arange(rows * n) % n,
+                                         'O2': O2.ravel(), 'tempC': tempC.ravel()}, schema = schema))
+
+def export(calc, path, chunk = CHUNK):
+    """Writes calc to path, a .npz file, .parquet folder or otherwise a folder of .npy files"""
+    if path.lower().endswith('.npz'):
+        export_npz(calc, path, chunk)
+    elif path.lower().endswith('.parquet'):
+        export_parquet(calc, path, chunk)
+    else:
+        export_npy(calc, path, chunk)
+
+def load_columns(path, mmap_mode = 'r'):
+    """
+    Returns dict like access to the columns written by export_npy() or
+    export_npz().  Columns in a folder are memory mapped (mmap_mode None to
+    read into memory), columns in a .npz are read when looked up.
+    """
+    if os.path.isdir(path):
+        return {name[:-4]: load(os.path.join(path, name), mmap_mode = mmap_mode)
+                for name in os.listdir(path) if name.endswith('.npy')}
+    return load(path)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Export results and gap filled series of a raw file '
+                                                   'as .npz, .npy columns or Parquet')
+    parser.add_argument('file', help = 'raw file')
+    parser.add_argument('start_time', help = 'start time of first close, HH:MM:SS')
+    parser.add_argument('start_date', help = 'start date of first close, dd/mm/yy')
+    parser.add_argument('cycle_time', help = 'duration of closed cycle, min:sec')
+    parser.add_argument('mass', type = float, help = 'fish mass (kg)')
+    parser.add_argument('volume', type = float, help = 'respirometer volume (L)')
+    parser.add_argument('output', help = 'file.npz, folder.parquet or a folder for .npy columns')
+    args = parser.parse_args()
+    try:
+        start_time = check_start_time(args.start_time)
+        start_date = check_start_date(args.start_date)
+        cycle_time = check_cycle_time(args.cycle_time)
+    except InputError as e:
+        parser.error('%s: %s' % (e.title, e.message.replace('\n', ', ')))
+    data = RawFileParse(args.file, start_time, start_date, cycle_time).get_data()
+    export(MO2Calculate(data, args.mass, args.volume, cycle_time), args.output)
+
+if __name__ == '__main__':
+    main()
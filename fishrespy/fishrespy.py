@@ -1,8 +1,157 @@
+import os
 import re
 import time
 import csv
+import gzip
+import bz2
+import lzma
+from collections.abc import Mapping
 from datetime import datetime, timedelta
-from numpy import array, ones, linalg, mean, std
+from instrument import NULL
+from numpy import (array, asarray, atleast_2d, arange, mean, median, percentile, std, searchsorted, flatnonzero, diff, cumsum, repeat,
+                   all as np_all, any as np_any, append, concatenate, empty, frombuffer, minimum, maximum, ones, take, unique,
+                   where, zeros)
+from numpy.random import default_rng
+
+class InputError(ValueError):
+    """Error in a user input, with a title and message for display"""
+    def __init__(self, title, message):
+        ValueError.__init__(self, message)
+        self.title = title
+        self.message = message
+
+def check_start_time(start_time):
+    """Checks start time is HH:MM:SS, raises InputError if not"""
+    parts = start_time.split(':')
+    if (len(start_time) != 8 or start_time[2] != ':' or start_time[5] != ':' or
+            not all(p.isdigit() for p in parts) or
+            int(parts[0]) > 23 or int(parts[1]) > 59 or int(parts[2]) > 59):
+        raise InputError('Time Error', 'Incorrect Start Time format\nRequires HH:MM:SS')
+    return start_time
+
+def check_start_date(start_date):
+    """Checks start date is dd/mm/yy, raises InputError if not"""
+    parts = start_date.split('/')
+    if (len(start_date) != 8 or start_date[2] != '/' or start_date[5] != '/' or
+            not all(p.isdigit() for p in parts) or
+            int(parts[0]) > 31 or int(parts[1]) > 12 or int(parts[2]) > 99):
+        raise InputError('Date Error', 'Incorrect Start Date format\nRequires dd/mm/yy')
+    return start_date
+
+def check_cycle_time(cycle_time):
+    """Checks cycle time is min:sec, returns (minutes, seconds).  Raises InputError if not"""
+    if ':' not in cycle_time:
+        raise InputError('Cycle Error', 'Incorrect separator in Cycle Time\nRequires min:sec')
+    parts = cycle_time.split(':')
+    if len(parts) != 2 or not all(p.strip().isdigit() for p in parts):
+        raise InputError('Cycle Error', 'Incorrect Cycle Time format\nRequires min:sec')
+    cycle_time = (int(parts[0]), int(parts[1]))
+    if cycle_time[1] > 59:
+        raise InputError('Cycle Error', 'Seconds must be less than 60')
+    return cycle_time
+
+def open_raw(file, buffering = 1 << 20):
+    """
+    Opens raw file to read bytes, decompressing a gzip, bzip2, xz or zstd
+    file (found from its first bytes, whatever its name) as it is read.
+    zstd needs Python 3.14 or the zstandard package.  Returns the file on
+    disk and the stream of its text, the same object for an uncompressed file.
+    """
+    raw = open(file, 'rb', buffering = buffering)
+    magic = raw.peek(6)[:6]
+    if magic.startswith(b'\x1f\x8b'):
+        return raw, gzip.GzipFile(fileobj = raw)
+    if magic.startswith(b'BZh'):
+        return raw, bz2.BZ2File(raw)
+    if magic.startswith(b'\xfd7zXZ\x00'):
+        return raw, lzma.LZMAFile(raw)
+    if magic.startswith(b'\x28\xb5\x2f\xfd'):
+        try:
+            from compression import zstd
+            return raw, zstd.ZstdFile(raw)
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            raw.close()
+            raise ImportError('Reading .zst raw files requires Python 3.14 or the zstandard package')
+        return raw, zstandard.ZstdDecompressor().stream_reader(raw, read_size = buffering)
+    return raw, raw
+
+class CycleData(Mapping):
+    """
+    Columnar store of the closed cycles parsed from a raw file.  The samples of
+    every closed cycle are held end to end in one contiguous array per variable,
+    about 24 bytes per sample:
+        epoch - seconds since 01/01/1970 00:00:00 of each sample, int64 array
+        O2 - O2 (mg/L) of each sample, float64 array
+        tempC - temp (deg C) of each sample, float64 array
+        offsets - cycle boundaries, int64 array with one more value than there
+                  are cycles.  Cycle i is samples offsets[i] to offsets[i + 1]
+
+    Also behaves as the read only dictionary returned by RawFileParse.get_data()
+    in earlier versions: key values refer to cycle index value, each value is a
+    dictionary of lists for 'date', 'time', 'O2' and 'tempC', built only when
+    the cycle is looked up.
+    """
+    EPOCH = datetime(1970, 1, 1)
+    DATETIME_FORMAT = '%d/%m/%y %H:%M:%S'
+
+    def __init__(self, epoch, O2, tempC, offsets):
+        self.epoch = asarray(epoch, dtype = 'int64')
+        self.O2 = asarray(O2, dtype = float)
+        self.tempC = asarray(tempC, dtype = float)
+        self.offsets = asarray(offsets, dtype = 'int64')
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build columnar store from a dictionary in the layout of the old
+        RawFileParse.get_data() output (cycle count mapped to dict of lists).
+        """
+        epoch, O2, tempC, offsets = [], [], [], [0]
+        for key in data:
+            close = data[key]
+            for date, time in zip(close['date'], close['time']):
+                dt = datetime.strptime(date + ' ' + time, cls.DATETIME_FORMAT)
+                epoch.append(int((dt - cls.EPOCH).total_seconds()))
+            O2.extend(close['O2'])
+            tempC.extend(close['tempC'])
+            offsets.append(len(epoch))
+        return cls(epoch, O2, tempC, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def __getitem__(self, key):
+        if not isinstance(key, int) or not 0 <= key < len(self):
+            raise KeyError(key)
+        epoch, O2, tempC = self.cycle(key)
+        dt = [self.to_datetime(t) for t in epoch]
+        return {'date': [t.strftime('%d/%m/%y') for t in dt],
+                'time': [t.strftime('%H:%M:%S') for t in dt],
+                'O2': O2.tolist(), 'tempC': tempC.tolist()}
+
+    def cycle(self, key):
+        """Returns epoch, O2 and tempC arrays of one closed cycle, views without a copy"""
+        i, j = self.offsets[key], self.offsets[key + 1]
+        return self.epoch[i:j], self.O2[i:j], self.tempC[i:j]
+
+    def to_datetime(self, sec):
+        """Convert seconds since the epoch to datetime object"""
+        return self.EPOCH + timedelta(seconds = int(sec))
+
+    def start(self, key):
+        """Returns date and time of first sample of a closed cycle as string"""
+        return self.to_datetime(self.epoch[self.offsets[key]]).strftime(self.DATETIME_FORMAT)
+
+    @property
+    def nbytes(self):
+        return self.epoch.nbytes + self.O2.nbytes + self.tempC.nbytes + self.offsets.nbytes
 
 class RawFileParse:
     """
@@ -10,7 +159,8 @@ class RawFileParse:
     other versions) recorded with a Fibox 3 fiber optic oxygen transmitter.
     Removes header and extracts only data from closed cycles.
     Data stored includes the variables date (dd/mm/yy), time (hh:mm:ss), O2 (mg/L) and temp
-    (deg C).  The class method get_data() returns a dictionary.  Key values refer
+    (deg C).  The class method get_data() returns a CycleData object, which holds
+    each variable in a single array and also reads as a dictionary.  Key values refer
     to cycle index value (0 to total # of closed cycles - 1).  Each key is another
     dictionary whose key values refer to a list for each data variable representing
     all the data for the particular variable from a single closed cycle.
@@ -20,24 +170,53 @@ class RawFileParse:
         start_time - start time for first closed cycle, string
         start_date - start date for first closed cycle, string
         cycle_time - duration of closed cycle, list or tuple [minutes, seconds]
+        extract - parse the whole file when created, default True.  Set False
+                  to feed blocks of the file to parse_chunk() yourself
+        cache - ParseCache (see parseCache.py) to load parsed samples from and
+                store them in, default None (always parse the text)
+        instrument - Instrument (see instrument.py) recording time spent and
+                     counts for each stage of the parse, default None
+        detect - find each close from the fall in O2 (see detect_bins()) rather
+                 than from start_time and cycle_time, default False.  The
+                 schedule is still used if no close is detected.  start_time
+                 and start_date may be None when detect is True
+        workers - number of processes parsing byte ranges of a large file at
+                  once (see read_ranges()), default 1.  None for one per core
     """
+    #width (s) of the running means compared by detect_bins(), at most a quarter of cycle_time
+    DETECT_WINDOW = 60
+    #shortest fall in O2 taken as a close, fraction of cycle_time
+    MIN_CLOSE = 0.5
 
-    def __init__(self, file, start_time, start_date, cycle_time):
+    def __init__(self, file, start_time, start_date, cycle_time, extract = True, cache = None,
+                 instrument = None, detect = False, workers = 1):
         self.file = file
+        self.cache = cache
+        self.instrument = instrument or NULL
         self.cycle_time = cycle_time
         self.start_time = start_time
         self.start_date = start_date
-        self.start_dateTime = start_date + ' ' + start_time
+        self.detect = detect
+        self.workers = workers
         self.TIME_FORMAT = '%H:%M:%S'
         self.DATETIME_FORMAT = '%d/%m/%y %H:%M:%S'
-        self.end_dateTime = self.add_time(self.convert_str_dateTime(self.start_dateTime),
-                                      self.cycle_time[0],
-                                      self.cycle_time[1])
+        self.start_dateTime = self.end_dateTime = None
+        if start_time is not None and start_date is not None:
+            self.start_dateTime = start_date + ' ' + start_time
+            self.end_dateTime = self.add_time(self.convert_str_dateTime(self.start_dateTime),
+                                          self.cycle_time[0],
+                                          self.cycle_time[1])
         #group lacations for result of re.search
         self.DATE, self.TIME, self.O2, self.TEMPC = 1, 2, 4, 7
         self.GROUPS = [self.DATE, self.TIME, self.O2, self.TEMPC]
         self.regex = re.compile(r'([\d+/]+\d+);\s+([\d+:]+\d+);\s+(\d+.\d+);\s+(\d+.\d+);\s+(\d+.\d+);\s+(\d+);\s+(\d+.\d+);')
-        self.bin_data = self.extract_data()
+        self.CHUNK_SIZE = 1 << 22
+        self.SMALL_BLOCK = 16
+        self.FIELD_WIDTH = 16
+        self.EPOCH = CycleData.EPOCH
+        #epoch, O2 and temp of every sample, kept by extract_data() for plotting the raw trace
+        self.samples = None
+        self.bin_data = self.extract_data() if extract else None
 
     def check_data(self, line):
         """
@@ -121,95 +300,410 @@ class RawFileParse:
                 line_data.append(match.group(i))
         return line_data
 
-    def extract_data(self):
+    def read_chunks(self, start = 0, end = None):
         """
-        Bins data into groupings based on the cycle_time and time of first
-        close (initial start_time), with cycle_time between each bin.
-        Returns dictionary object with cycle count (begins with 0) mapped to
-        a list of a list of data lines.
-        """
-        bin_data = {}
-        data = []
-        count = 0
-        record, first_flag_set = False, False
-        start_dateTime = self.start_dateTime
-        end_dateTime_list = self.list_dateTime(self.end_dateTime)
-        end_dateTime = self.end_dateTime
-
-        with open(self.file, 'r') as f:
-            for line in f:
+        Generator yielding large blocks of bytes from file.  Each block ends
+        on a line boundary, so no data line is split across two blocks.
+        Compressed files are decompressed as they are read (see open_raw()),
+        bytes_read counts the bytes of the file on disk.  start and end limit
+        the blocks to a byte range of an uncompressed file, as split by
+        split_file() for read_ranges(), default the whole file.
+        """
+        rest = b''
+        raw, f = open_raw(self.file)
+        with raw, f:
+            if start:
+                f.seek(start)
+            done = raw.tell()
+            while end is None or start < end:
+                with self.instrument.stage('read'):
+                    chunk = f.read(self.CHUNK_SIZE if end is None else min(self.CHUNK_SIZE, end - start))
+                if not chunk:
+                    break
+                start += len(chunk)
+                self.instrument.count('bytes_read', raw.tell() - done)
+                done = raw.tell()
+                chunk = rest + chunk
+                cut = chunk.rfind(b'\n') + 1
+                rest = chunk[cut:]
+                if cut:
+                    yield chunk[:cut]
+        if rest:
+            yield rest
+
+    def date_seconds(self, s):
+        """Convert a date string (dd/mm/yy) to integer seconds since the epoch"""
+        return (datetime.strptime(s, '%d/%m/%y') - self.EPOCH).days * 86400
+
+    def time_seconds(self, s):
+        """Convert a time string (hh:mm:ss) to integer seconds since midnight"""
+        t = time.strptime(s, self.TIME_FORMAT)
+        return t.tm_hour * 3600 + t.tm_min * 60 + t.tm_sec
+
+    def gather(self, buf, pos, width):
+        """
+        Returns 2-D array of the width byte codes of buf starting at each
+        position in pos, one column per position (clipped to the end of buf).
+        Row i holds the i-th byte of every field, so the checks on each byte
+        and the sums over a field are operations on whole contiguous rows.
+        """
+        return buf[minimum(arange(width)[:, None] + pos, len(buf) - 1)]
+
+    def parse_fields(self, buf, a, b, point = True, convert = True):
+        """
+        Vectorized conversion of the text buf[a:b] for every pair of positions
+        in a and b to float.  Returns array of values (None if convert is
+        False) and a boolean array which is False for any field that isn't
+        plain digits with a single decimal point inside (no point if point is
+        False), or is too long to convert exactly.
+        """
+        width = b - a
+        ok = (width > 0) & (width <= self.FIELD_WIDTH)
+        ncols = int(width[ok].max()) if np_any(ok) else 1
+        column = arange(ncols)[:, None]
+        inside = column < width
+        codes = self.gather(buf, a, ncols)
+        #as uint8 any byte other than a digit wraps round to more than 9
+        digits = codes - 48
+        isdigit = (digits <= 9) & inside
+        ispoint = (codes == 46) & inside
+        ok &= np_all(isdigit | ispoint | ~inside, axis = 0)
+        decimals = 0
+        if point:
+            #position of the point in fields with a single one
+            at = (column * ispoint).sum(axis = 0)
+            ok &= (ispoint.sum(axis = 0) == 1) & (at > 0) & (at < width - 1)
+            decimals = where(ok, width - 1 - at, 0)
+        else:
+            ok &= ~np_any(ispoint, axis = 0)
+        if not convert:
+            return None, ok
+        value = zeros(len(a), dtype = 'int64')
+        for c in range(ncols):
+            value = where(isdigit[c], value * 10 + digits[c], value)
+        #both numbers are exact in float64, so the division is correctly rounded
+        return value / 10.0 ** decimals, ok
+
+    def parse_chunk(self, chunk):
+        """
+        Tokenize every line in a block of bytes at once.  Lines laid out as
+        Oxyview writes them ('dd/mm/yy; hh:mm:ss; ' followed by plain numbers
+        separated by '; ') are converted with array operations on the raw bytes,
+        any other line goes through check_data() and extract_line_data().
+        Returns arrays of epoch seconds (int), O2 and temp (float) for each
+        data line in the block.  A block of fewer than SMALL_BLOCK lines is
+        quicker to parse one line at a time, see parse_lines().
+        """
+        if chunk.count(b'\n') < self.SMALL_BLOCK:
+            return self.parse_lines(chunk)
+        with self.instrument.stage('tokenize'):
+            epoch, O2, tempC, fast, starts, ends = self.tokenize(chunk)
+        self.instrument.count('lines', len(fast))
+        self.instrument.count('lines_tokenized', fast.sum())
+
+        with self.instrument.stage('regex'):
+            for i in flatnonzero(~fast):
+                match = self.check_data(chunk[starts[i]:ends[i]].decode('latin-1'))
+                if not match:
+                    self.instrument.count('lines_rejected')
+                    continue
+                try:
+                    date, time, O2[i], tempC[i] = self.extract_line_data(match)
+                    epoch[i] = self.date_seconds(date) + self.time_seconds(time)
+                    fast[i] = True
+                    self.instrument.count('lines_matched')
+                except ValueError:
+                    self.instrument.count('lines_rejected')
+        return epoch[fast], O2[fast], tempC[fast]
+
+    def parse_lines(self, chunk):
+        """
+        parse_chunk() for a few lines, as read when following a file or from a
+        live instrument.  Every line goes through check_data() and
+        extract_line_data(), which costs less than the array set up of
+        tokenize() for so few lines.
+        """
+        epoch, O2, tempC = [], [], []
+        with self.instrument.stage('regex'):
+            for line in chunk.decode('latin-1').splitlines():
+                self.instrument.count('lines')
                 match = self.check_data(line)
                 if not match:
+                    self.instrument.count('lines_rejected')
                     continue
-                else:
-                    if not first_flag_set:
-                        curr_time = match.group(self.TIME)
-                        #checks against list of [start_time, start_time + 1 second] to account for
-                        #seconds which weren't written to raw data file
-                        if curr_time in self.convert_dateTime_string(self.list_dateTime(self.start_time, mode = 2), mode = 2):
-                            end_dateTime, end_dateTime_list = self.increment_time(start_dateTime, end_dateTime, mode = 2)
-                            data.append(self.extract_line_data(match))
-                            record = True
-                            first_flag_set = True
-                            continue
-                        else:
-                            continue
-                    curr_dateTime = match.group(self.DATE) + ' ' + match.group(self.TIME)
-                    if not record:
-                        #if reached start time
-                        if curr_dateTime in self.convert_dateTime_string(start_dateTime_list):
-                            record = True
-                            end_dateTime, end_dateTime_list = self.increment_time(start_dateTime, end_dateTime, mode = 2)
-                            data.append(self.extract_line_data(match))
-                            continue
-                        else:
-                            continue
-                    if record:
-                        #if reached end time
-                        if curr_dateTime in self.convert_dateTime_string(end_dateTime_list):
-                            record = False
-                            start_dateTime, start_dateTime_list = self.increment_time(start_dateTime, end_dateTime)
-                            bin_data[count] = data
-                            count += 1
-                            data = []
-                        else:
-                            data.append(self.extract_line_data(match))
-        return bin_data
-
-    def list_to_dict(self, lst):
-        """
-        takes a list of lists and returns a dict with key = data type
-        ('date', 'time', 'O2', 'tempC') with value = a list of all data
-        for that data type in the closed cycle
-        """
-        tmp = {0: [], 1: [], 2: [], 3: []}
-        for line in lst:
-            for key in tmp:
-                tmp[key].append(line[key])
-        d = {'date': tmp[0], 'time': tmp[1], 'O2': tmp[2], 'tempC': tmp[3]}
-        return d
-
-    def formatData(self, d):
-        """
-        Takes output from RawFileParse.extract_data() and returns dict object,
-        key = cycle count, value = dict with a key for each data type ('date',
-        'time', 'O2', 'tempC').  Each data type is a list of that data type for
-        the closed cycle in cycle count
-        """
-        for key in d:
-            d[key] = self.list_to_dict(d[key])
-        return d
+                try:
+                    date, time, O2_value, tempC_value = self.extract_line_data(match)
+                    epoch.append(self.date_seconds(date) + self.time_seconds(time))
+                except ValueError:
+                    self.instrument.count('lines_rejected')
+                    continue
+                O2.append(O2_value)
+                tempC.append(tempC_value)
+                self.instrument.count('lines_matched')
+        return array(epoch, dtype = 'int64'), array(O2, dtype = float), array(tempC, dtype = float)
+
+    def tokenize(self, chunk):
+        """
+        Array part of parse_chunk().  Returns arrays of epoch seconds, O2 and
+        temp, a boolean array which is False for lines not in the Oxyview
+        layout, and start and end positions of each line in chunk.
+        """
+        buf = frombuffer(chunk, dtype = 'uint8')
+        ends = flatnonzero(buf == 10)
+        if len(ends) == 0 or ends[-1] != len(buf) - 1:
+            ends = append(ends, len(buf))
+        starts = append(0, ends[:-1] + 1)
+        nlines = len(starts)
+
+        #fixed layout of date and time at the start of the line, 0 for a digit.  As
+        #uint8, a byte less its layout byte is at most 9 for a digit and 0 for any other
+        layout = frombuffer(b'00/00/00; 00:00:00; ', dtype = 'uint8')[:, None]
+        head = self.gather(buf, starts, 20)
+        fast = (ends - starts >= 20) & np_all(head - layout <= where(layout == 48, 9, 0).astype('uint8'), axis = 0)
+        head = head.astype('int64')
+
+        #position of each ';', ending with one past the end of the block
+        semis = append(flatnonzero(buf == 59), len(buf))
+        k = minimum(searchsorted(semis, starts) + 6, len(semis) - 1)
+        fast &= semis[k] < ends
+        fields = []
+        for j in range(2, 7):
+            #clipped at 0 for blocks with fewer ';' than one data line, whose lines are not fast anyway
+            a = semis[maximum(k - 7 + j, 0)] + 1
+            fast &= buf[minimum(a, len(buf) - 1)] == 32
+            value, ok = self.parse_fields(buf, a + 1, semis[maximum(k - 6 + j, 0)], point = j != 5,
+                                          convert = j in (3, 6))
+            fast &= ok
+            fields.append(value)
+
+        dd, mo, yy = [head[i] * 10 + head[i + 1] - 528 for i in (0, 3, 6)]
+        hh, mi, ss = [head[i] * 10 + head[i + 1] - 528 for i in (10, 13, 16)]
+        fast &= (hh < 24) & (mi < 60) & (ss < 62)
+        days = zeros(nlines, dtype = 'int64')
+        keys, inverse = unique(where(fast, dd * 10000 + mo * 100 + yy, -1), return_inverse = True)
+        for i, key in enumerate(keys):
+            try:
+                days[inverse == i] = self.date_seconds('%02d/%02d/%02d' % (key // 10000, key // 100 % 100, key % 100))
+            except ValueError:
+                fast[inverse == i] = False
+
+        epoch = days + hh * 3600 + mi * 60 + ss
+        return epoch, fields[1], fields[4], fast, starts, ends
+
+    def read_samples(self):
+        """
+        Tokenize every data line in file in large blocks.  Returns a tuple of
+        arrays of epoch seconds (int), O2 and temp (float), one entry per data
+        line.  An uncompressed file of more than two blocks is split between
+        processes by read_ranges() unless workers is 1.
+        """
+        if self.workers != 1 and os.path.getsize(self.file) > 2 * self.CHUNK_SIZE:
+            raw, f = open_raw(self.file)
+            raw.close()
+            if raw is f:
+                return self.read_ranges()
+        blocks = [self.parse_chunk(chunk) for chunk in self.read_chunks()]
+        if not blocks:
+            return tuple(array([], dtype = t) for t in ('int64', float, float))
+        return tuple(concatenate(col) for col in zip(*blocks))
+
+    def split_file(self, parts):
+        """Returns list of about parts (start, end) byte ranges of file, each ending on a line boundary"""
+        size = os.path.getsize(self.file)
+        cuts = [0]
+        with open(self.file, 'rb') as f:
+            for k in range(1, parts):
+                f.seek(max(size * k // parts - 1, cuts[-1]))
+                #a range ends after the newline ending the line that holds its last byte
+                f.readline()
+                cuts.append(f.tell())
+        cuts.append(size)
+        return [(a, b) for a, b in zip(cuts[:-1], cuts[1:]) if a < b]
+
+    def read_ranges(self):
+        """
+        Parallel version of read_samples().  File is split into byte ranges on
+        line boundaries, four per worker process, each range is tokenized into
+        arrays in a worker and the arrays are joined back in file order, so
+        binning sees exactly the samples a serial parse gives.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        workers = self.workers or os.cpu_count() or 1
+        ranges = self.split_file(4 * workers)
+        blocks = []
+        with self.instrument.stage('tokenize'), ProcessPoolExecutor(max_workers = workers) as pool:
+            for (start, end), block in zip(ranges, pool.map(parse_range, [(self.file, self.cycle_time, start, end)
+                                                                           for start, end in ranges])):
+                self.instrument.count('bytes_read', end - start)
+                blocks.append(block)
+        return tuple(concatenate(col) for col in zip(*blocks))
+
+    def find_time(self, epoch, lo, t, ordered = True):
+        """
+        Returns index of the first value in epoch at or after index lo that
+        equals t or t + 1 (to account for seconds which weren't written to the
+        raw data file), or -1 if there is none.  Uses binary search if epoch is
+        ordered, otherwise checks each value in turn.
+        """
+        if ordered:
+            i = lo + searchsorted(epoch[lo:], t)
+            if i < len(epoch) and epoch[i] <= t + 1:
+                return i
+            return -1
+        for i in range(lo, len(epoch)):
+            if epoch[i] == t or epoch[i] == t + 1:
+                return i
+        return -1
+
+    def find_first(self, epoch, lo):
+        """
+        Returns index of the first value in epoch at or after index lo whose
+        time of day is start_time or start_time + 1 second, or -1 if there is
+        none.  Used for the first close, which is matched on time only.
+        """
+        tod = self.time_seconds(self.start_time)
+        first = flatnonzero((epoch[lo:] % 86400 == tod) | (epoch[lo:] % 86400 == (tod + 1) % 86400))
+        return lo + first[0] if len(first) else -1
+
+    def start_seconds(self):
+        """Returns start date and time of the first close as seconds since the epoch"""
+        return int((self.convert_str_dateTime(self.start_dateTime) - self.EPOCH).total_seconds())
+
+    def bin_samples(self, epoch, O2 = None):
+        """
+        Returns list of [start, end) index pairs into epoch for each closed
+        cycle.  A close starts at the first sample matching start_time (time of
+        day only for the first close) and ends before the sample matching
+        start + cycle_time, the next close starts cycle_time later.  A close
+        whose end isn't found is dropped, as is everything after a close whose
+        start isn't found.  With detect, the closes are found from O2 by
+        detect_bins() instead, using the schedule only if none are found.
+        """
+        with self.instrument.stage('bin'):
+            bins = []
+            if self.detect and O2 is not None:
+                bins = self.detect_bins(epoch, O2)
+            if not bins and self.start_dateTime is not None:
+                bins = self.find_bins(epoch)
+        self.instrument.count('cycles_binned', len(bins))
+        return bins
+
+    def detect_bins(self, epoch, O2):
+        """
+        Finds closed cycles from the O2 trace alone, in the same [start, end)
+        index pair layout as find_bins().  The rate of change of O2 at each
+        sample is the difference between the mean O2 of the DETECT_WINDOW
+        seconds after and before it.  A close is a run where O2 falls at more
+        than half the typical rate while closed, the point where the rate
+        crosses half way marks the change from flush to close.  Runs shorter
+        than MIN_CLOSE of cycle_time are ignored.  Each close found starts at
+        the first sample of its run and holds cycle_time of samples, as a
+        scheduled close does.  Returns empty list if epoch is out of order or
+        no close is found.
+        """
+        cycle = self.cycle_time[0] * 60 + self.cycle_time[1]
+        epoch = asarray(epoch)
+        if len(epoch) < 3 or not np_all(diff(epoch) >= 0):
+            return []
+        half = max(min(self.DETECT_WINDOW, cycle // 4) // 2, 1)
+        #running sums of O2 about its mean, bounded so the sums keep their precision
+        y = asarray(O2, dtype = float)
+        sums = concatenate([[0.], cumsum(y - y.mean())])
+        lo = searchsorted(epoch, epoch - half)
+        mid = arange(len(epoch))
+        hi = searchsorted(epoch, epoch + half, 'right')
+        before, after = maximum(mid - lo, 1), maximum(hi - mid, 1)
+        rate = ((sums[hi] - sums[mid]) / after - (sums[mid] - sums[lo]) / before) / half
+        rate[(mid == lo) | (hi == mid)] = 0
+
+        #typical rate while closed from the steepest quarter, then half of it as threshold
+        threshold = percentile(rate, 25) / 2
+        if threshold >= 0:
+            return []
+        closed = rate < median(rate[rate < threshold]) / 2
+        edges = diff(concatenate([[0], closed.view('int8'), [0]]))
+        starts, ends = flatnonzero(edges == 1), flatnonzero(edges == -1)
+        #join runs split by noise, less than half the window apart
+        join = epoch[starts[1:]] - epoch[ends[:-1] - 1] < half
+        starts = starts[concatenate([[True], ~join])]
+        ends = ends[concatenate([~join, [True]])]
+        keep = epoch[ends - 1] - epoch[starts] >= self.MIN_CLOSE * cycle
+        starts = starts[keep]
+        ends = searchsorted(epoch, epoch[starts] + cycle)
+        #drop a close cut off by the end of the file or overlapping the one before
+        keep = (ends < len(epoch)) & (starts >= concatenate([[0], ends[:-1]]))
+        return [[int(a), int(b)] for a, b in zip(starts[keep], ends[keep])]
+
+    def find_bins(self, epoch):
+        """Binning part of bin_samples()"""
+        bins = []
+        ordered = bool(np_all(diff(epoch) >= 0))
+        cycle = self.cycle_time[0] * 60 + self.cycle_time[1]
+        start = self.find_first(epoch, 0)
+        start_sec = self.start_seconds()
+        while start >= 0:
+            end_sec = start_sec + cycle
+            end = self.find_time(epoch, start + 1, end_sec, ordered)
+            if end < 0:
+                return bins
+            bins.append([start, end])
+            start_sec = end_sec + cycle
+            start = self.find_time(epoch, end + 1, start_sec, ordered)
+        return bins
+
+    def extract_data(self):
+        """
+        Bins data into groupings based on the cycle_time and time of first
+        close (initial start_time), with cycle_time between each bin.
+        Returns CycleData object holding only the samples of closed cycles,
+        cycle count (begins with 0) is the index into its offsets.
+        """
+        self.samples = self.get_samples()
+        epoch, O2, tempC = self.samples
+        return self.cycle_data(epoch, O2, tempC, self.bin_samples(epoch, O2))
+
+    def cycle_data(self, epoch, O2, tempC, bins):
+        """Returns CycleData of the samples in each [start, end) index pair of bins"""
+        offsets = cumsum([0] + [end - start for start, end in bins])
+        index = concatenate([arange(start, end) for start, end in bins] + [zeros(0, dtype = 'int64')])
+        return CycleData(epoch[index], O2[index], tempC[index], offsets)
 
     def get_data(self):
-        return self.formatData(self.bin_data)
+        return self.bin_data
+
+    def get_samples(self):
+        """
+        Returns arrays of epoch seconds, O2 and temp of every data line in file.
+        Loaded from cache when it holds the unchanged file, otherwise parsed
+        with read_samples() and stored.
+        """
+        if self.cache is not None:
+            with self.instrument.stage('cache'):
+                samples = self.cache.load(self.file)
+            if samples is not None:
+                self.instrument.count('cache_hits')
+                return samples
+        samples = self.read_samples()
+        self.store_data(samples)
+        return samples
 
-    def store_data(self):
-        # use pickle if need method to store results of file parse
-        pass
+    def store_data(self, samples):
+        """Stores tuple of epoch, O2 and temp arrays parsed from file in cache, if any"""
+        if self.cache is not None:
+            self.cache.store(self.file, *samples)
 
 ##############################################
 
 
+def parse_range(args):
+    """Worker for RawFileParse.read_ranges(), returns epoch, O2 and temp of one (file, cycle_time, start, end) byte range"""
+    file, cycle_time, start, end = args
+    parser = RawFileParse(file, None, None, cycle_time, extract = False)
+    blocks = [parser.parse_chunk(chunk) for chunk in parser.read_chunks(start, end)]
+    if not blocks:
+        return tuple(array([], dtype = t) for t in ('int64', float, float))
+    return tuple(concatenate(col) for col in zip(*blocks))
+
 class MO2Calculate:
     """
     Class to calculate oxygen consumption for each closed cycle in a single
@@ -218,16 +712,27 @@ class MO2Calculate:
     a dictionary of summary data for each closed cycle.
 
     Inputs:
-        data - dictionary returned from RawFileParse.get_data()
+        data - CycleData returned from RawFileParse.get_data() (or a dictionary
+               in the same layout, converted to CycleData)
         mass - mass of fish
         volume - volume of chamber
+        cycle_time - duration of closed cycle, list or tuple [minutes, seconds]
+        instrument - Instrument (see instrument.py) recording time spent and
+                     counts for each stage, default None
     """
-    def __init__(self, data, mass, volume, cycle_time):
+    #header of the output, one name per value of a get_data() row
+    COLUMNS = ['slope', 'R2', 'start', 'MO2', 'mass', 'meanTemp', 'sdTemp']
+
+    def __init__(self, data, mass, volume, cycle_time, instrument = None):
+        if not isinstance(data, CycleData):
+            data = CycleData.from_dict(data)
+        self.instrument = instrument or NULL
         self.data = data
         self.mass = mass
         self.volume = volume
         self.cycle_time = cycle_time
         self.DATETIME_FORMAT = '%d/%m/%y %H:%M:%S'
+        self.columns = list(self.COLUMNS)
         self.output = self.storeMO2()
 
     def get_close(self, cycle_count):
@@ -272,50 +777,206 @@ class MO2Calculate:
         """Checks for missing values (values not recorded in raw file).  If value
            is missing, generates value for that time as the average of the
            previous and last values.  Returns list of O2 values for full cycle
-           period.
+           period.  Date and time are lists of strings, see fill_gaps() for
+           the same on seconds from the start of the cycle.
         """
-        seconds = self.cycle_time[0] * 60 + self.cycle_time[1]
-        start = datetime.strptime(date[0] + ' ' + time[0], self.DATETIME_FORMAT)
-        sec = timedelta(seconds = 1)
         dt = self.str_to_datetime(date, time)
-        dt_key = {}
-        for i in range(len(dt)):
-            dt_key[dt[i]] = O2[i]
-        qc_dt = [start]
-        for i in range(1, seconds): #number of seconds in close cycle
-            qc_dt.append(qc_dt[i-1] + sec)
-        qc_O2 = [0.] * seconds
-        mvals = []
-        for i in range(len(qc_dt)):
-            if qc_dt[i] in dt_key:
-                qc_O2[i] = dt_key[qc_dt[i]]
-            else:
-                mvals.append([i, qc_dt[i]])
-                if i == 0:
-                    sub = dt_key[qc_dt[i+1]]
-                elif i == len(qc_dt) - 1:
-                    sub = dt_key[qc_dt[i-1]]
-                else:
-                    prev = dt_key[qc_dt[i-1]]
-                    nxt = dt_key[qc_dt[i+1]]
-                    sub = (nxt + prev) / 2.
-                qc_O2[i] = sub
-        return qc_O2
+        return self.fill_gaps([int((t - dt[0]).total_seconds()) for t in dt], O2)
+
+    def fill_gaps(self, seconds, O2):
+        """Checks for missing values in a closed cycle given the O2 values and
+           their time in seconds from the first value.  See fill_gaps_all(),
+           returns list of O2 values for full cycle period.
+        """
+        seconds = asarray(seconds, dtype = 'int64')
+        qc_O2, gaps, longest, filled = self.fill_gaps_all(zeros(len(seconds), dtype = 'int64'), seconds, O2, 1)
+        return qc_O2[0].tolist()
+
+    def fill_gaps_all(self, cycle, seconds, O2, ncycles):
+        """Checks for missing values (values not recorded in raw file) in every
+           closed cycle at once.  cycle, seconds and O2 are arrays with the
+           cycle index, seconds from the start of the cycle and O2 of each
+           value.  Values are placed on a grid of one second steps for the
+           full cycle period, each missing value is generated by linear
+           interpolation between the previous and next values (the nearest
+           value at the start or end of the cycle).  Returns 2-D array of O2
+           values (one row per cycle), and arrays with the number of gaps, the
+           longest gap (seconds) and number of values filled in each cycle.
+        """
+        n = self.cycle_time[0] * 60 + self.cycle_time[1]
+        keep = (seconds >= 0) & (seconds < n)
+        qc_O2 = zeros((ncycles, n))
+        observed = zeros((ncycles, n), dtype = bool)
+        qc_O2[cycle[keep], seconds[keep]] = asarray(O2, dtype = float)[keep]
+        observed[cycle[keep], seconds[keep]] = True
+
+        #index of the previous and next observed value for every second
+        index = arange(n)
+        prev = maximum.accumulate(where(observed, index, -1), axis = 1)
+        nxt = minimum.accumulate(where(observed, index, n)[:, ::-1], axis = 1)[:, ::-1]
+        missing = ~observed
+        rows = arange(ncycles)[:, None]
+        y0 = qc_O2[rows, maximum(prev, 0)]
+        y1 = qc_O2[rows, minimum(nxt, n - 1)]
+        span = where(missing, nxt - prev, 1)
+        fill = (y0 * (nxt - index) + y1 * (index - prev)) / span
+        fill = where(prev < 0, y1, where(nxt >= n, y0, fill))
+        qc_O2[missing] = fill[missing]
+
+        after = concatenate([ones((ncycles, 1), dtype = bool), observed[:, :-1]], axis = 1)
+        gaps = (missing & after).sum(axis = 1)
+        longest = where(missing, nxt - prev - 1, 0).max(axis = 1, initial = 0)
+        return qc_O2, gaps, longest, missing.sum(axis = 1)
+
+    def fit_slopes(self, O2):
+        """Fits slopes to a batch of O2 time series at once.  O2 is a 2-D array
+           (or list of equal length lists) with one closed cycle per row.
+           Uses closed form least squares sums over every row together.
+           Returns arrays of slope, intercept, SSE and R-sq values, one value
+           per row.
+        """
+        y = atleast_2d(asarray(O2, dtype = float))
+        x = arange(y.shape[1], dtype = float)
+        dx = x - x.mean()
+        ym = y.mean(axis = 1)
+        dy = y - ym[:, None]
+        slope = dy.dot(dx) / dx.dot(dx)
+        intercept = ym - slope * x.mean()
+        SSE = ((dy - slope[:, None] * dx) ** 2).sum(axis = 1)
+        SST = (dy ** 2).sum(axis = 1)
+        R2 = 1 - (SSE / SST)
+        return slope, intercept, SSE, R2
 
     def fit_slope(self, O2):
         """Fits slope to O2 time series, returns slope and R-sq value"""
-        x = range(len(O2))
-        A = array([x, ones(len(O2))])
-        y = O2
-        model = linalg.lstsq(A.T, y)
-        slope = model[0][0]
-        SSE = model[1][0]
-        mn = mean(O2)
-        SST = sum((O2 - mn)**2)
-        R2 = 1 - (SSE / SST)
-        return slope, R2
+        slope, intercept, SSE, R2 = self.fit_slopes([O2])
+        return slope[0], R2[0]
+
+    def window_fits(self, O2, width):
+        """Fits slopes to every window of width values in each row of 2-D
+           O2, from running sums so the cost does not grow with width.
+           Returns 2-D arrays of slope, intercept and R-sq values with one
+           column per window start (0 to row length - width), the same values
+           fit_slopes() gives for each window on its own.
+        """
+        y = atleast_2d(asarray(O2, dtype = float))
+        n = y.shape[1]
+        if not 2 <= width <= n:
+            raise ValueError('window must be 2 to %d seconds' % n)
+        #remove the mean of each row first so the running sums do not lose precision
+        ym = y.mean(axis = 1)[:, None]
+        y = y - ym
+        x = arange(n, dtype = float)
+        pad = zeros((y.shape[0], 1))
+        Sy = concatenate([pad, cumsum(y, axis = 1)], axis = 1)
+        Sxy = concatenate([pad, cumsum(y * x, axis = 1)], axis = 1)
+        Syy = concatenate([pad, cumsum(y * y, axis = 1)], axis = 1)
+        start = arange(n - width + 1)
+        sy = Sy[:, start + width] - Sy[:, start]
+        #sum of x * y with x counted from the start of each window
+        sxy = Sxy[:, start + width] - Sxy[:, start] - start * sy
+        syy = Syy[:, start + width] - Syy[:, start]
+        sx = width * (width - 1) / 2.
+        sxx = (width - 1) * width * (2 * width - 1) / 6. - sx * sx / width
+        slope = (sxy - sx * sy / width) / sxx
+        SST = syy - sy * sy / width
+        R2 = slope * slope * sxx / SST
+        intercept = (sy - slope * sx) / width + ym
+        return slope, intercept, R2
+
+    def best_windows(self, width, skip = 0):
+        """Finds the window of width seconds with the highest R-sq in each
+           closed cycle of qc_O2, ignoring windows starting less than skip
+           seconds into the cycle (e.g. straight after the flush).  Returns
+           dictionary in the layout of get_data(), with slope, R-sq, start,
+           MO2, mean temp and sd temp of the best window of each closed cycle,
+           temp from the samples recorded within the window (NaN if none).
+        """
+        new_data = {}
+        if len(self.data) == 0:
+            return new_data
+        slope, intercept, R2 = self.window_fits(self.qc_O2[:, skip:], width)
+        best = R2.argmax(axis = 1)
+        first = self.data.epoch[self.data.offsets[:-1]] + skip + best
+        for key in self.data:
+            epoch, O2, tempC = self.data.cycle(key)
+            tempC = tempC[(epoch >= first[key]) & (epoch < first[key] + width)]
+            start = self.data.to_datetime(first[key]).strftime(self.DATETIME_FORMAT)
+            MO2 = self.O2consumption(slope[key, best[key]], self.mass, self.volume)
+            new_data[key] = [slope[key, best[key]], R2[key, best[key]], start, MO2, self.mass,
+                             mean(tempC) if len(tempC) else float('nan'), std(tempC) if len(tempC) else float('nan')]
+        return new_data
+
+    def rolling_MO2(self, width):
+        """Returns arrays of epoch seconds at the middle of every window of
+           width seconds in every closed cycle, and MO2 from the slope of each
+           window, end to end as one continuous series.
+        """
+        if len(self.data) == 0:
+            return zeros(0), zeros(0)
+        slope = self.window_fits(self.qc_O2, width)[0]
+        first = self.data.epoch[self.data.offsets[:-1]]
+        middle = first[:, None] + arange(slope.shape[1]) + (width - 1) / 2.
+        return middle.ravel(), self.O2consumption(slope, self.mass, self.volume).ravel()
+
+    def bootstrap_slopes(self, O2, replicates = 1000, block = None, seed = None, chunk = 1 << 22):
+        """Refits slopes to replicates resampled copies of each row of 2-D O2
+           at once: the fitted line plus residuals drawn with replacement
+           (residual bootstrap), or with block set, runs of block residuals
+           drawn with replacement (moving block bootstrap, for autocorrelated
+           O2).  The x values are fixed, so each refit is the fitted slope plus
+           the slope of the drawn residuals, one dot product per replicate.
+           Rows are done chunk values at a time to bound memory, and the same
+           seed gives the same draws.  Returns 2-D array of slopes, one row
+           per row of O2 and one column per replicate.
+        """
+        y = atleast_2d(asarray(O2, dtype = float))
+        ncycles, n = y.shape
+        slope, intercept = self.fit_slopes(y)[:2]
+        x = arange(n, dtype = float)
+        dx = x - x.mean()
+        resid = y - intercept[:, None] - slope[:, None] * x
+        rng = default_rng(seed)
+        out = empty((ncycles, replicates))
+        step = max(chunk // (replicates * n), 1)
+        for a in range(0, ncycles, step):
+            b = min(a + step, ncycles)
+            if block is None or block <= 1:
+                index = rng.integers(0, n, size = (b - a, replicates, n))
+            else:
+                block = min(block, n)
+                starts = rng.integers(0, n - block + 1, size = (b - a, replicates, -(-n // block)))
+                index = (starts[..., None] + arange(block)).reshape(b - a, replicates, -1)[..., :n]
+            #index into the flattened residuals of rows a to b
+            draws = take(resid[a:b], index + (arange(b - a) * n)[:, None, None])
+            out[a:b] = slope[a:b, None] + draws.dot(dx) / dx.dot(dx)
+        return out
+
+    def confidence_intervals(self, replicates = 1000, level = 0.95, block = None, seed = None):
+        """Bootstrap (see bootstrap_slopes()) percentile confidence intervals
+           at level for the slope and MO2 of each closed cycle from qc_O2.
+           Returns dictionary of arrays slope_lo, slope_hi, MO2_lo and MO2_hi.
+        """
+        if len(self.data) == 0:
+            return dict((name, zeros(0)) for name in ('slope_lo', 'slope_hi', 'MO2_lo', 'MO2_hi'))
+        slopes = self.bootstrap_slopes(self.qc_O2, replicates, block, seed)
+        lo, hi = percentile(slopes, [50 * (1 - level), 50 * (1 + level)], axis = 1)
+        #MO2 falls as slope rises
+        return {'slope_lo': lo, 'slope_hi': hi, 'MO2_lo': self.O2consumption(hi, self.mass, self.volume),
+                'MO2_hi': self.O2consumption(lo, self.mass, self.volume)}
+
+    def add_ci(self, replicates = 1000, level = 0.95, block = None, seed = None):
+        """Adds slope_lo, slope_hi, MO2_lo and MO2_hi columns from
+           confidence_intervals() to the end of each row of output.
+        """
+        ci = self.confidence_intervals(replicates, level, block, seed)
+        names = ['slope_lo', 'slope_hi', 'MO2_lo', 'MO2_hi']
+        for key in range(len(self.output)):
+            self.output[key] = self.output[key] + [ci[name][key] for name in names]
+        self.columns = self.columns + names
 
-    def O2consumption(self, slope, mass, volume):
+    @staticmethod
+    def O2consumption(slope, mass, volume):
         """
         Return MO2 (mgO2/kg/h)
         """
@@ -323,24 +984,39 @@ class MO2Calculate:
 
     def storeMO2(self):
         """Calculates slope, R-sq, MO2, mean temp and sd temp for each closed
-           cycle.  Returns dictionary of summary statistics for each closed cycle
+           cycle.  Returns dictionary of summary statistics for each closed cycle.
+           The gap filled O2 of every cycle, number of gaps and longest gap per
+           cycle are kept in qc_O2, gaps and longest_gap.
         """
         new_data = {}
+        if len(self.data) == 0:
+            #no closed cycles, nothing to fill, keep the qc attributes empty
+            self.qc_O2 = zeros((0, self.cycle_time[0] * 60 + self.cycle_time[1]))
+            self.gaps = zeros(0, dtype = 'int64')
+            self.longest_gap = zeros(0, dtype = 'int64')
+            return new_data
 
-        for key in self.data:
-            close = self.get_close(key)
-            date = self.get_var(close, 'date')
-            time = self.get_var(close, 'time')
-            start = date[0] + ' ' + time[0]
-            O2 = self.get_var(close, 'O2')
-            tempC = self.get_var(close, 'tempC')
-            qc_O2 = self.quality_control(date, time, O2)
-            slope, R2 = self.fit_slope(qc_O2)
-            MO2 = self.O2consumption(slope, self.mass, self.volume)
-            meanTemp = mean(tempC)
-            sdTemp = std(tempC)
-            variables = [slope, R2, start, MO2, self.mass, meanTemp, sdTemp]
-            new_data[key] = variables
+        counts = diff(self.data.offsets)
+        cycle = repeat(arange(len(self.data)), counts)
+        seconds = self.data.epoch - repeat(self.data.epoch[self.data.offsets[:-1]], counts)
+        with self.instrument.stage('qc'):
+            self.qc_O2, self.gaps, self.longest_gap, filled = self.fill_gaps_all(cycle, seconds, self.data.O2,
+                                                                                 len(self.data))
+        self.instrument.count('samples_interpolated', filled.sum())
+        with self.instrument.stage('fit'):
+            slopes, intercepts, SSE, R2s = self.fit_slopes(self.qc_O2)
+        self.instrument.count('cycles_fitted', len(slopes))
+
+        with self.instrument.stage('summary'):
+            for key in self.data:
+                epoch, O2, tempC = self.data.cycle(key)
+                start = self.data.start(key)
+                slope, R2 = slopes[key], R2s[key]
+                MO2 = self.O2consumption(slope, self.mass, self.volume)
+                meanTemp = mean(tempC)
+                sdTemp = std(tempC)
+                variables = [slope, R2, start, MO2, self.mass, meanTemp, sdTemp]
+                new_data[key] = variables
         return new_data
 
     def get_data(self):
@@ -351,10 +1027,108 @@ class MO2Calculate:
         """Writes output from _storeMO2() to .csv file with header. File is
            path to destination.
         """
-        with open(file, 'w', newline = '') as f:
+        with self.instrument.stage('save'), open(file, 'w', newline = '') as f:
             w = csv.writer(f)
-            header = ['slope', 'R2', 'start', 'MO2', 'mass', 'meanTemp', 'sdTemp']
-            w.writerow(header)
+            w.writerow(self.columns)
             for row in range(len(self.output)):
                 line = self.output[row]
                 w.writerow(line)
+
+def main():
+    """
+    Headless command line: parse, QC, fit and save results for one raw file
+    with the same inputs as the GUI.  Tk and matplotlib are only imported
+    with --gui.
+    """
+    import sys
+    import argparse
+    parser = argparse.ArgumentParser(prog = 'python -m fishrespy',
+                                     description = 'Calculate MO2 for each closed cycle of a raw Oxyview file')
+    parser.add_argument('file', nargs = '?', help = 'raw file')
+    parser.add_argument('start_time', nargs = '?', help = 'start time of first close, HH:MM:SS ("-" with --detect)')
+    parser.add_argument('start_date', nargs = '?', help = 'start date of first close, dd/mm/yy ("-" with --detect)')
+    parser.add_argument('cycle_time', nargs = '?', help = 'duration of closed cycle, min:sec')
+    parser.add_argument('mass', nargs = '?', type = float, help = 'fish mass (kg)')
+    parser.add_argument('volume', nargs = '?', type = float, help = 'respirometer volume (L)')
+    parser.add_argument('-o', '--output', help = 'results .csv (default: write to stdout)')
+    parser.add_argument('--detect', action = 'store_true',
+                        help = 'find each close from the fall in O2 instead of from start time and cycle time')
+    parser.add_argument('--window', type = int, help = 'report the best (highest R2) window of this many seconds '
+                                                       'in each closed cycle instead of the whole cycle')
+    parser.add_argument('--skip', type = int, default = 0,
+                        help = 'with --window, seconds after the start of each close to leave out')
+    parser.add_argument('--ci', type = int, metavar = 'REPLICATES',
+                        help = 'add bootstrap 95%% confidence intervals of slope and MO2 from this many replicates')
+    parser.add_argument('--block', type = int,
+                        help = 'with --ci, resample runs of this many seconds of residuals (block bootstrap)')
+    parser.add_argument('--seed', type = int, help = 'with --ci, seed of the random draws')
+    parser.add_argument('--low-memory', action = 'store_true',
+                        help = 'fit each close as soon as it is read and keep nothing else, '
+                               'memory use does not grow with the length of the file')
+    parser.add_argument('-w', '--workers', type = int, default = 1,
+                        help = 'processes parsing parts of the file at once (0 for one per core)')
+    parser.add_argument('--cache', help = 'directory of parse cache, see parseCache.py')
+    parser.add_argument('--report', action = 'store_true', help = 'print time spent in each stage to stderr')
+    parser.add_argument('--gui', action = 'store_true', help = 'open the GUI instead')
+    args = parser.parse_args()
+
+    if args.gui:
+        from fishrespyGUI import main as gui
+        return gui()
+    if args.volume is None:
+        parser.error('file, start_time, start_date, cycle_time, mass and volume are required')
+    try:
+        start_time = start_date = None
+        if not (args.detect and args.start_time == '-' and args.start_date == '-'):
+            start_time = check_start_time(args.start_time)
+            start_date = check_start_date(args.start_date)
+        cycle_time = check_cycle_time(args.cycle_time)
+    except InputError as e:
+        parser.error('%s: %s' % (e.title, e.message.replace('\n', ', ')))
+
+    if args.low_memory:
+        if args.detect or args.window or args.ci or args.cache or args.workers != 1:
+            parser.error('--low-memory cannot be used with --detect, --window, --ci, --cache or --workers')
+        from streamMO2 import StreamMO2
+        stream = StreamMO2(args.file, start_time, start_date, cycle_time, args.mass, args.volume, follow = False)
+        if args.output:
+            stream.save_data(args.output)
+        else:
+            w = csv.writer(sys.stdout)
+            w.writerow(MO2Calculate.COLUMNS)
+            w.writerows(stream)
+        return
+
+    cache = None
+    if args.cache:
+        from parseCache import ParseCache
+        cache = ParseCache(args.cache)
+    instrument = None
+    if args.report:
+        from instrument import Instrument
+        instrument = Instrument()
+
+    data = RawFileParse(args.file, start_time, start_date, cycle_time, cache = cache, detect = args.detect,
+                        workers = args.workers or None, instrument = instrument).get_data()
+    res = MO2Calculate(data, args.mass, args.volume, cycle_time, instrument = instrument)
+    if args.window:
+        if args.ci:
+            parser.error('--ci cannot be used with --window')
+        try:
+            res.output = res.best_windows(args.window, args.skip)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.ci:
+        with res.instrument.stage('bootstrap'):
+            res.add_ci(args.ci, block = args.block, seed = args.seed)
+    if args.output:
+        res.save_data(args.output)
+    else:
+        w = csv.writer(sys.stdout)
+        w.writerow(res.columns)
+        w.writerows(res.get_data().values())
+    if instrument is not None:
+        sys.stderr.write(str(instrument.report()) + '\n')
+
+if __name__ == '__main__':
+    main()
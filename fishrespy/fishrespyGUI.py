@@ -1,5 +1,10 @@
-from fishrespy import RawFileParse, MO2Calculate
-from displayData import DisplayData
+from fishrespy import RawFileParse, MO2Calculate, InputError, check_start_time, check_start_date, check_cycle_time
+from traceView import TraceView
+from resultsModel import ResultsModel
+from instrument import Progress, Cancelled
+import os
+import queue
+import threading
 from tkinter import *
 from tkinter import ttk
 from tkinter import filedialog
@@ -7,15 +12,17 @@ from tkinter import messagebox
 
 class MO2GUI:
     """Class to implement GUI for RawFileParse and MO2Calc classes.
-       Implemented in tkinter.
+       Implemented in tkinter.  The calculation runs on a worker thread and
+       reports progress through a queue polled from the Tk event loop, so the
+       window stays responsive and the calculation can be cancelled.
     """
     def __init__(self, root):
         self.root = root
         self.root.title("MO2 Calculator")
         self.root.columnconfigure(0, weight = 1)
         self.root.rowconfigure(0, weight = 1)
-        self.root.minsize(300, 425)
-        self.root.maxsize(300, 425)
+        self.root.minsize(300, 480)
+        self.root.maxsize(300, 480)
 
         #Configure Frame
         self.frame = ttk.Frame(self.root, padding = 3)
@@ -30,12 +37,17 @@ class MO2GUI:
         self.time = StringVar()
         self.date = StringVar()
         self.cycle_time = StringVar()
+        self.status = StringVar()
+        self.progress = None
+        self.queue = queue.Queue()
+        self.POLL = 100
 
         #initialize widgets
         self.createWidgets()
 
     def get_file(self):
-        file = filedialog.askopenfilename(filetypes = [('Text Files', '*.txt')])
+        file = filedialog.askopenfilename(filetypes = [('Text Files', '*.txt'),
+                                                       ('Compressed Files', '*.gz *.bz2 *.xz *.zst')])
         self.file.set(file)
 
     def calculate(self):
@@ -43,31 +55,16 @@ class MO2GUI:
         if file == '':
             messagebox.showerror('File Error', 'Incorrect File entry')
             return
-        outfile = self.outfile.get()
-        start_time = self.time.get()
-        st_check = start_time.split(':')
-        if start_time[2] != ':' or start_time[5] != ':':
-            messagebox.showerror('Time Error', 'Incorrect Start Time format\nRequires HH:MM:SS')
-            return
-        if int(st_check[0]) > 23 or int(st_check[1]) > 59 or int(st_check[2]) > 59:
-            messagebox.showerror('Time Error', 'Incorrect Start Time format\nRequires HH:MM:SS')
-            return
-        start_date = self.date.get()
-        d_check = start_date.split('/')
-        if start_date[2] != '/' or start_date[5] != '/':
-            messagebox.showerror('Date Error', 'Incorrect Start Date format\nRequires dd/mm/yy')
+        if not os.path.isfile(file):
+            messagebox.showerror('File Error', 'File not found\n%s' % file)
             return
-        if int(d_check[0]) > 31 or int(d_check[1]) > 12 or int(d_check[2]) > 99:
-            messagebox.showerror('Date Error', 'Incorrect Start Date format\nRequires dd/mm/yy')
-            return
-        cycle_time = self.cycle_time.get()
-        if ':' not in cycle_time:
-            messagebox.showerror('Cycle Error', 'Incorrect separator in Cycle Time\nRequires min:sec')
-            return
-        cycle_time = cycle_time.split(':')
-        cycle_time = (int(cycle_time[0]), int(cycle_time[1]))
-        if cycle_time[1] > 59:
-            messagebox.showerror('Cycle Error', 'Seconds must be less than 60')
+        outfile = self.outfile.get()
+        try:
+            start_time = check_start_time(self.time.get())
+            start_date = check_start_date(self.date.get())
+            cycle_time = check_cycle_time(self.cycle_time.get())
+        except InputError as e:
+            messagebox.showerror(e.title, e.message)
             return
         mass = self.mass.get()
         volume = self.volume.get()
@@ -75,18 +72,65 @@ class MO2GUI:
         if volume == 0:
             volume = self.custom.get()
 
-        output = RawFileParse(file, start_time, start_date, cycle_time).get_data()
-        res = MO2Calculate(output, mass, volume, cycle_time)
-
-        MO2 = res.get_data()
-        self.showData(MO2)
-
-    def showData(self, data):
+        self.progress = Progress(self.queue)
+        self.progress_bar.configure(maximum = max(os.path.getsize(file), 1), value = 0)
+        self.status.set('Reading file')
+        self.calc_button.configure(state = 'disabled')
+        self.cancel_button.configure(state = 'normal')
+        worker = threading.Thread(target = self.run, args = (self.progress, file, start_time, start_date,
+                                                             cycle_time, mass, volume))
+        worker.daemon = True
+        worker.start()
+        self.root.after(self.POLL, self.poll)
+
+    def run(self, progress, file, start_time, start_date, cycle_time, mass, volume):
+        """Runs on the worker thread, puts ('done', results, trace) on the queue when finished"""
+        try:
+            raw = RawFileParse(file, start_time, start_date, cycle_time, instrument = progress)
+            output = raw.get_data()
+            res = MO2Calculate(output, mass, volume, cycle_time, instrument = progress)
+            self.queue.put(('done', ResultsModel.from_calc(res), TraceView(raw.samples, output, cycle_time, res)))
+        except Cancelled:
+            self.queue.put(('cancelled', None, None))
+        except Exception as e:
+            self.queue.put(('error', e, None))
+
+    def cancel(self):
+        if self.progress is not None:
+            self.progress.cancel()
+            self.status.set('Cancelling')
+
+    def poll(self):
+        """Shows progress put on the queue by the worker thread, until it is finished"""
+        stages = {'tokenize': 'Parsing', 'regex': 'Parsing', 'bin': 'Binning closed cycles',
+                  'qc': 'Filling gaps', 'fit': 'Fitting slopes', 'summary': 'Fitting slopes'}
+        while True:
+            try:
+                kind, name, value = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'stage' and name in stages and not self.progress.cancelled.is_set():
+                self.status.set(stages[name])
+            elif kind == 'count' and name == 'bytes_read':
+                self.progress_bar.configure(value = value)
+            elif kind == 'count':
+                self.status.set('%s: %d' % (name.replace('_', ' ').capitalize(), value))
+            elif kind in ('done', 'cancelled', 'error'):
+                self.progress = None
+                self.calc_button.configure(state = 'normal')
+                self.cancel_button.configure(state = 'disabled')
+                self.status.set('' if kind == 'done' else kind.capitalize())
+                if kind == 'done':
+                    self.showData(name, value)
+                elif kind == 'error':
+                    messagebox.showerror('Calculation Error', str(name))
+                return
+        self.root.after(self.POLL, self.poll)
+
+    def showData(self, data, trace = None):
+        from displayData import DisplayData
         self.popup = Toplevel(self.root)
-        view = DisplayData(self.popup, data)
-        view.createHeader()
-        view.createRowLabels()
-        view.createCells()
+        view = DisplayData(self.popup, data, trace)
 
         self.popup.transient(self.root)
         self.popup.grab_set()
@@ -168,8 +212,18 @@ class MO2GUI:
         bottom_frame.grid(column = 0, row = 1, sticky = (W,E))
         bottom_frame.columnconfigure(0, weight = 1)
 
-        calc_button = ttk.Button(bottom_frame, text = 'Calculate', command = self.calculate)
-        calc_button.grid(column = 0, row = 0)
+        self.calc_button = ttk.Button(bottom_frame, text = 'Calculate', command = self.calculate)
+        self.calc_button.grid(column = 0, row = 0)
+
+        self.cancel_button = ttk.Button(bottom_frame, text = 'Cancel', command = self.cancel, state = 'disabled')
+        self.cancel_button.grid(column = 1, row = 0)
+
+        #bytes of the raw file parsed so far
+        self.progress_bar = ttk.Progressbar(bottom_frame, orient = 'horizontal', mode = 'determinate')
+        self.progress_bar.grid(column = 0, row = 1, columnspan = 2, sticky = (W,E))
+
+        status_label = ttk.Label(bottom_frame, textvariable = self.status)
+        status_label.grid(column = 0, row = 2, columnspan = 2, sticky = W)
 
 def main():
     root = Tk()
@@ -0,0 +1,214 @@
+import os
+import sys
+import csv
+import json
+import asyncio
+import logging
+import argparse
+from streamMO2 import StreamMO2
+from batchRun import parse_cycle_time
+from fishrespy import MO2Calculate, check_start_time, check_start_date
+
+log = logging.getLogger('ingestService')
+
+HEADER = ['chamber'] + MO2Calculate.COLUMNS
+READ_SIZE = 1 << 16
+
+def read_config(file):
+    """
+    Reads .json list of chambers, each an object with name, source,
+    start_time, start_date, cycle_time ('min:sec'), mass and volume.  source
+    is 'tcp://host:port' or the path of a FIFO or serial (tty) device.
+    Returns list of dicts.
+    """
+    with open(file, 'r') as f:
+        entries = json.load(f)
+    return [{'name': entry['name'], 'source': entry['source'],
+             'start_time': check_start_time(entry['start_time'].strip()),
+             'start_date': check_start_date(entry['start_date'].strip()),
+             'cycle_time': parse_cycle_time(entry['cycle_time']),
+             'mass': float(entry['mass']), 'volume': float(entry['volume'])} for entry in entries]
+
+async def open_source(source):
+    """
+    Returns asyncio StreamReader of a 'tcp://host:port' source, or of a FIFO
+    or tty device path, and the StreamWriter to close a TCP source (None for
+    a path).
+    """
+    if source.startswith('tcp://'):
+        host, port = source[6:].rsplit(':', 1)
+        return await asyncio.open_connection(host, int(port))
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    #opening a FIFO waits for its writer, so open on a thread.  Serial settings
+    #(baud rate etc.) are left as set on the device, e.g. with stty
+    pipe = open(await loop.run_in_executor(None, os.open, source, os.O_RDONLY), 'rb', buffering = 0)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    return reader, None
+
+class IngestService:
+    """
+    Reads PST3 lines from many Fibox transmitters at once in one asyncio event
+    loop.  Each chamber has its own source, cycle binner and MO2 fit (a
+    StreamMO2 fed with the lines as they arrive), and a row is passed to
+    on_row(name, row) as soon as each close ends.  Lines are parsed with the
+    same rules as RawFileParse.  Waiting on the sources costs no CPU, each
+    line costs one small parse, so dozens of 1 Hz instruments use a tiny
+    part of one core.
+
+    Chambers are independent: a source which cannot be opened or fails
+    while being read is retried after backoff seconds, doubling up to
+    max_backoff, while the other chambers carry on.  A chamber is given up
+    (and logged) after retries failures in a row, or on any other error.
+    The count and the wait start again from the first once a source is
+    opened.  A TCP source closed by the transmitter (e.g. when it restarts)
+    is reconnected, the end of a FIFO or serial device ends the chamber.
+    stop() ends every chamber.
+
+    Inputs:
+        chambers - list of dicts as from read_config()
+        on_row - called with chamber name and row ([slope, R2, start, MO2,
+                 mass, meanTemp, sdTemp]) for each closed cycle
+        retries - failures in a row before a chamber is given up, None to
+                  retry for ever.  Default 10
+        backoff - seconds before the first retry, default 1
+        max_backoff - longest wait between retries, default 60
+    """
+    def __init__(self, chambers, on_row, retries = 10, backoff = 1., max_backoff = 60.):
+        self.chambers = chambers
+        self.on_row = on_row
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failed = {}
+        self.tasks = []
+
+    def stop(self):
+        """Stops reading every chamber, run() returns once they have stopped"""
+        for task in self.tasks:
+            task.cancel()
+
+    async def read_source(self, chamber, stream, reader, writer):
+        """Feeds stream with the lines of one connection to the chamber's source until it ends"""
+        rest = b''
+        try:
+            while True:
+                chunk = await reader.read(READ_SIZE)
+                if not chunk:
+                    break
+                chunk = rest + chunk
+                cut = chunk.rfind(b'\n') + 1
+                rest = chunk[cut:]
+                if cut:
+                    for row in stream.feed(chunk[:cut]):
+                        self.on_row(chamber['name'], row)
+            if rest:
+                for row in stream.feed(rest):
+                    self.on_row(chamber['name'], row)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    async def ingest(self, chamber):
+        """
+        Reads one chamber's source until it ends, reconnecting after connection
+        errors and after a TCP source is closed
+        """
+        #the binner and open cycle are kept across reconnects
+        stream = StreamMO2(None, chamber['start_time'], chamber['start_date'], chamber['cycle_time'],
+                           chamber['mass'], chamber['volume'])
+        failures = 0
+        wait = self.backoff
+        while True:
+            try:
+                reader, writer = await open_source(chamber['source'])
+                failures = 0
+                wait = self.backoff
+                await self.read_source(chamber, stream, reader, writer)
+                if not chamber['source'].startswith('tcp://'):
+                    return
+                log.info('chamber %s: connection closed, reconnecting in %g s', chamber['name'], wait)
+                await asyncio.sleep(wait)
+            except OSError as e:
+                failures += 1
+                if self.retries is not None and failures > self.retries:
+                    raise
+                log.warning('chamber %s: %s, retrying in %g s', chamber['name'], e, wait)
+                await asyncio.sleep(wait)
+                wait = min(wait * 2, self.max_backoff)
+
+    async def run(self):
+        """
+        Ingests every chamber until all sources have ended or been given up,
+        or stop() is called.
+        Returns dict of the name of each chamber given up mapped to its error
+        (also kept in failed).
+        """
+        self.tasks = [asyncio.ensure_future(self.ingest(chamber)) for chamber in self.chambers]
+        results = await asyncio.gather(*self.tasks, return_exceptions = True)
+        for chamber, result in zip(self.chambers, results):
+            #a chamber stopped by stop() is cancelled, not failed
+            if isinstance(result, Exception):
+                log.error('chamber %s stopped: %r', chamber['name'], result)
+                self.failed[chamber['name']] = result
+        return self.failed
+
+async def replay(file, host = '127.0.0.1', port = 9000, rate = 1., drop = None):
+    """
+    Simulator of a transmitter: serves file (e.g. from ExampleData) on a TCP
+    port, sending each connection its lines at rate lines per second (0 for
+    as fast as possible) from the start, then closing the connection.  With
+    drop, each connection is closed after drop lines, as by a transmitter
+    restarting, and the next connection carries on from the following line.
+    """
+    with open(file, 'rb') as f:
+        lines = f.readlines()
+    sent = [0]
+
+    async def send(reader, writer):
+        first = sent[0] if drop else 0
+        last = min(first + drop, len(lines)) if drop else len(lines)
+        sent[0] = last
+        for line in lines[first:last]:
+            writer.write(line)
+            await writer.drain()
+            if rate:
+                await asyncio.sleep(1. / rate)
+        writer.close()
+
+    server = await asyncio.start_server(send, host, port)
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Calculate MO2 from many instruments streaming PST3 lines')
+    parser.add_argument('config', nargs = '?', help = '.json list of chambers, see read_config()')
+    parser.add_argument('-o', '--output', help = 'results .csv (default: write to stdout)')
+    parser.add_argument('--simulate', metavar = 'RAW_FILE', help = 'instead serve the lines of a raw file on --port')
+    parser.add_argument('--port', type = int, default = 9000)
+    parser.add_argument('--rate', type = float, default = 1., help = 'simulated lines per second, 0 for no wait')
+    parser.add_argument('--drop', type = int, help = 'simulated transmitter closes the connection after this many lines')
+    args = parser.parse_args()
+
+    if args.simulate:
+        return asyncio.run(replay(args.simulate, port = args.port, rate = args.rate, drop = args.drop))
+    if args.config is None:
+        parser.error('config is required')
+    f = open(args.output, 'w', newline = '') if args.output else sys.stdout
+    w = csv.writer(f)
+    w.writerow(HEADER)
+    f.flush()
+
+    def on_row(name, row):
+        w.writerow([name] + row)
+        f.flush()
+
+    logging.basicConfig(format = '%(asctime)s %(levelname)s %(message)s')
+    try:
+        asyncio.run(IngestService(read_config(args.config), on_row).run())
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import time
+import cProfile
+import threading
+
+class Report:
+    """
+    Structured report from an Instrument.  stages is a dict of stage name
+    mapped to dict with total wall time (s) and number of calls, counters is a
+    dict of counter name mapped to total count.
+    """
+    def __init__(self, stages, counters):
+        self.stages = stages
+        self.counters = counters
+
+    def as_dict(self):
+        return {'stages': self.stages, 'counters': self.counters}
+
+    def __str__(self):
+        lines = ['%-12s %10s %8s' % ('stage', 'time (s)', 'calls')]
+        for name, stage in self.stages.items():
+            lines.append('%-12s %10.4f %8d' % (name, stage['time'], stage['calls']))
+        lines.append('')
+        lines.append('%-24s %12s' % ('counter', 'count'))
+        for name, value in self.counters.items():
+            lines.append('%-24s %12d' % (name, value))
+        return '\n'.join(lines)
+
+
+class Stage:
+    """Context manager timing one call to a stage of an Instrument"""
+    def __init__(self, record):
+        self.record = record
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.record[0] += time.perf_counter() - self.start
+        self.record[1] += 1
+        return False
+
+
+class Instrument:
+    """
+    Opt in instrumentation of RawFileParse and MO2Calculate.  Pass as the
+    instrument argument to either class, then call report() for wall time and
+    call count of each stage and totals of counters such as lines matched,
+    cycles binned and samples interpolated.  Used as a context manager with a
+    profile path, the code inside is also run under cProfile and the stats are
+    dumped to that file on exit.
+
+    Inputs:
+        profile - path of cProfile dump, default None (no profiling)
+    """
+    def __init__(self, profile = None):
+        self.profile = profile
+        self.profiler = None
+        self.stages = {}
+        self.counters = {}
+
+    def __enter__(self):
+        if self.profile is not None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile)
+            self.profiler = None
+        return False
+
+    def stage(self, name):
+        """Returns context manager adding wall time of the code inside to stage name"""
+        if name not in self.stages:
+            self.stages[name] = [0., 0]
+        return Stage(self.stages[name])
+
+    def count(self, name, value = 1):
+        """Adds value to counter name"""
+        self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def report(self):
+        """Returns Report of everything recorded so far"""
+        return Report({name: {'time': t, 'calls': n} for name, (t, n) in self.stages.items()},
+                      dict(self.counters))
+
+
+class Cancelled(Exception):
+    """Raised inside a calculation run with a Progress instrument once it is cancelled"""
+
+
+class Progress(Instrument):
+    """
+    Instrument for running RawFileParse and MO2Calculate on a worker thread.
+    As well as recording as Instrument does, it puts ('stage', name, None)
+    on queue as each stage starts and ('count', name, total) as bytes read,
+    cycles binned and cycles fitted are counted, for another thread to poll.
+    After cancel() the next stage or count raises Cancelled on the worker.
+
+    Inputs:
+        queue - queue.Queue to put progress on
+    """
+    POSTED = ('bytes_read', 'cycles_binned', 'cycles_fitted')
+
+    def __init__(self, queue):
+        Instrument.__init__(self)
+        self.queue = queue
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise Cancelled()
+
+    def stage(self, name):
+        self.check()
+        self.queue.put(('stage', name, None))
+        return Instrument.stage(self, name)
+
+    def count(self, name, value = 1):
+        self.check()
+        Instrument.count(self, name, value)
+        if name in self.POSTED:
+            self.queue.put(('count', name, self.counters[name]))
+
+
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullInstrument:
+    """Instrument which records nothing, the default when instrumentation is disabled"""
+    STAGE = NullStage()
+
+    def stage(self, name):
+        return self.STAGE
+
+    def count(self, name, value = 1):
+        pass
+
+    def report(self):
+        return Report({}, {})
+
+NULL = NullInstrument()
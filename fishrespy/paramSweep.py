@@ -0,0 +1,92 @@
+import csv
+import argparse
+from itertools import product
+from numpy import asarray
+from fishrespy import RawFileParse, MO2Calculate, InputError, check_start_time, check_start_date, check_cycle_time
+
+HEADER = ['start_time', 'start_date', 'cycle_time', 'mass', 'volume', 'cycle', 'slope', 'R2', 'start', 'MO2',
+          'meanTemp', 'sdTemp']
+
+class ParamSweep:
+    """
+    Calculates MO2 of one raw file for many combinations of start time, start
+    date, cycle time, mass and volume.  The file is parsed once, its samples
+    kept in file order, and each configuration only bins (with the same rules
+    as RawFileParse, by binary search when the samples are in time order),
+    fills gaps and fits.  Configurations sharing start and cycle time are
+    binned and fitted once, MO2 for each mass and volume is then one array
+    operation.
+
+    Inputs:
+        file - directory path to raw file, string
+        cache - ParseCache to load the parsed samples from, default None
+        workers - processes parsing the file, see RawFileParse, default 1
+    """
+    def __init__(self, file, cache = None, workers = 1):
+        self.file = file
+        parser = RawFileParse(file, None, None, (0, 0), extract = False, cache = cache, workers = workers)
+        epoch, O2, tempC = parser.get_samples()
+        self.epoch, self.O2, self.tempC = asarray(epoch), asarray(O2), asarray(tempC)
+
+    def bin(self, start_time, start_date, cycle_time):
+        """Returns CycleData of the closed cycles for one start time, start date and cycle time"""
+        parser = RawFileParse(self.file, start_time, start_date, cycle_time, extract = False)
+        return parser.cycle_data(self.epoch, self.O2, self.tempC, parser.bin_samples(self.epoch))
+
+    def fit(self, start_time, start_date, cycle_time, mass, volume):
+        """Returns MO2Calculate of one configuration"""
+        return MO2Calculate(self.bin(start_time, start_date, cycle_time), mass, volume, cycle_time)
+
+    def run(self, configs):
+        """
+        Calculates MO2 for each configuration in configs, a list of dicts with
+        start_time, start_date, cycle_time ([minutes, seconds]), mass and
+        volume.  Returns list of rows laid out as HEADER, one per closed cycle
+        of each configuration, in the order of configs.
+        """
+        fits = {}
+        rows = []
+        for config in configs:
+            key = (config['start_time'], config['start_date'], tuple(config['cycle_time']))
+            if key not in fits:
+                calc = self.fit(*key, mass = config['mass'], volume = config['volume'])
+                output = calc.get_data()
+                fits[key] = calc, [output[c] for c in range(len(output))]
+            calc, summary = fits[key]
+            slope = asarray([row[0] for row in summary], dtype = float)
+            MO2 = calc.O2consumption(slope, config['mass'], config['volume'])
+            label = [key[0], key[1], '%d:%02d' % key[2], config['mass'], config['volume']]
+            for c, row in enumerate(summary):
+                rows.append(label + [c, row[0], row[1], row[2], MO2[c], row[5], row[6]])
+        return rows
+
+    def grid(self, start_times, start_dates, cycle_times, masses, volumes):
+        """Runs every combination of the values given for each input, returns rows as run()"""
+        return self.run([{'start_time': t, 'start_date': d, 'cycle_time': c, 'mass': m, 'volume': v}
+                         for t, d, c, m, v in product(start_times, start_dates, cycle_times, masses, volumes)])
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Calculate MO2 of one raw file for every combination '
+                                                   'of start time, cycle time, mass and volume')
+    parser.add_argument('file', help = 'raw file')
+    parser.add_argument('output', help = 'results .csv')
+    parser.add_argument('--start-time', nargs = '+', required = True, help = 'HH:MM:SS')
+    parser.add_argument('--start-date', nargs = '+', required = True, help = 'dd/mm/yy')
+    parser.add_argument('--cycle-time', nargs = '+', required = True, help = 'min:sec')
+    parser.add_argument('--mass', nargs = '+', type = float, required = True)
+    parser.add_argument('--volume', nargs = '+', type = float, required = True)
+    args = parser.parse_args()
+    try:
+        start_times = [check_start_time(t) for t in args.start_time]
+        start_dates = [check_start_date(d) for d in args.start_date]
+        cycle_times = [check_cycle_time(c) for c in args.cycle_time]
+    except InputError as e:
+        parser.error('%s: %s' % (e.title, e.message.replace('\n', ', ')))
+    rows = ParamSweep(args.file).grid(start_times, start_dates, cycle_times, args.mass, args.volume)
+    with open(args.output, 'w', newline = '') as f:
+        w = csv.writer(f)
+        w.writerow(HEADER)
+        w.writerows(rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+from numpy import load, save
+
+try:
+    import fcntl
+except ImportError:
+    #windows
+    fcntl = None
+    import msvcrt
+
+class IndexLock:
+    """
+    Exclusive lock on the cache index held while it is read, changed and
+    written, so processes sharing one cache folder do not lose each other's
+    entries.  Locks a separate lock file, the index itself is replaced on
+    every write.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.f = None
+
+    def __enter__(self):
+        self.f = open(self.file, 'a+')
+        if fcntl is not None:
+            fcntl.flock(self.f, fcntl.LOCK_EX)
+        else:
+            self.f.seek(0)
+            msvcrt.locking(self.f.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+        else:
+            self.f.seek(0)
+            msvcrt.locking(self.f.fileno(), msvcrt.LK_UNLCK, 1)
+        self.f.close()
+        self.f = None
+        return False
+
+class ParseCache:
+    """
+    On disk cache of the samples parsed from raw files by RawFileParse.
+    Each file is stored as one uncompressed .npy array per variable (epoch
+    seconds, O2 and temp), loaded back by memory mapping, so repeat parses of
+    an unchanged file skip reading the text.  Entries are keyed by file path,
+    size, modification time and a hash of the first and last blocks of the
+    file, any change to the file gives a new key.  When the cache grows over
+    max_bytes the least recently used entries are removed.  The index is only
+    changed under IndexLock, and eviction sizes the entries found in the
+    folder, so entries missing from the index (left by a crash) are removed
+    rather than filling the disk unseen.
+
+    Inputs:
+        folder - directory for cache files, default ~/.cache/fishrespy
+        max_bytes - size limit of cache in bytes, default 2 GB
+    """
+    COLUMNS = ('epoch', 'O2', 'tempC')
+    BLOCK = 1 << 20
+    #seconds after which an entry still being written is taken as left by a crash
+    STALE = 3600
+    #names of entry directories, key() and the temporary name used by store()
+    ENTRY = re.compile(r'[0-9a-f]{32}(\.\d+\.tmp)?$')
+
+    def __init__(self, folder = None, max_bytes = 2 << 30):
+        if folder is None:
+            folder = os.path.join(os.path.expanduser('~'), '.cache', 'fishrespy')
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(folder, 'index.json')
+        os.makedirs(folder, exist_ok = True)
+        self.lock = IndexLock(os.path.join(folder, 'index.lock'))
+
+    def key(self, file):
+        """Returns cache key (hex string) for the current state of file"""
+        st = os.stat(file)
+        h = hashlib.blake2b(digest_size = 16)
+        h.update(('%s|%d|%d' % (os.path.abspath(file), st.st_size, st.st_mtime_ns)).encode())
+        with open(file, 'rb') as f:
+            h.update(f.read(self.BLOCK))
+            if st.st_size > self.BLOCK:
+                f.seek(-self.BLOCK, os.SEEK_END)
+                h.update(f.read(self.BLOCK))
+        return h.hexdigest()
+
+    def read_index(self):
+        """Returns dict of key mapped to file, size (bytes) and last use of each entry"""
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_index(self, index):
+        tmp = self.index_file + '.%d.tmp' % os.getpid()
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, self.index_file)
+
+    def load(self, file):
+        """
+        Returns tuple of memory mapped epoch, O2 and temp arrays for file, or
+        None if the cache has no entry for the current state of file.
+        """
+        key = self.key(file)
+        entry = os.path.join(self.folder, key)
+        try:
+            samples = tuple(load(os.path.join(entry, c + '.npy'), mmap_mode = 'r') for c in self.COLUMNS)
+        except (OSError, ValueError):
+            return None
+        with self.lock:
+            index = self.read_index()
+            if key in index:
+                index[key]['used'] = time.time()
+                self.write_index(index)
+        return samples
+
+    def store(self, file, epoch, O2, tempC):
+        """Stores epoch, O2 and temp arrays parsed from file, then trims cache to max_bytes"""
+        key = self.key(file)
+        entry = os.path.join(self.folder, key)
+        tmp = entry + '.%d.tmp' % os.getpid()
+        os.makedirs(tmp, exist_ok = True)
+        for c, values in zip(self.COLUMNS, (epoch, O2, tempC)):
+            save(os.path.join(tmp, c + '.npy'), values)
+        #write under a temporary name first so a half written entry is never loaded,
+        #then move it in under the lock so eviction never sees it without its index entry
+        with self.lock:
+            shutil.rmtree(entry, ignore_errors = True)
+            os.replace(tmp, entry)
+            index = self.read_index()
+            index[key] = {'file': os.path.abspath(file), 'used': time.time(), 'bytes': self.size(entry)}
+            self.write_index(self.evict(index))
+
+    def size(self, path):
+        """Returns total bytes of the files in directory path"""
+        total = 0
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def entries(self):
+        """
+        Returns dict of key mapped to bytes on disk of every entry directory in
+        the folder.  Directories still being written by store() are left out
+        until they are older than STALE seconds, then they are counted under
+        their own name so eviction removes them as orphans.
+        """
+        found = {}
+        now = time.time()
+        for d in os.scandir(self.folder):
+            if not d.is_dir() or not self.ENTRY.match(d.name):
+                continue
+            if d.name.endswith('.tmp') and now - d.stat().st_mtime < self.STALE:
+                continue
+            found[d.name] = self.size(d.path)
+        return found
+
+    def evict(self, index):
+        """
+        Removes entry directories not in index, drops index entries with no
+        directory, then removes least recently used entries until the folder
+        is within max_bytes.  Sizes are measured on disk.  Returns index, call
+        with the lock held.
+        """
+        found = self.entries()
+        for key in set(found) - set(index):
+            shutil.rmtree(os.path.join(self.folder, key), ignore_errors = True)
+            del found[key]
+        for key in set(index) - set(found):
+            del index[key]
+        for key in index:
+            index[key]['bytes'] = found[key]
+        total = sum(found.values())
+        for key in sorted(index, key = lambda k: index[k]['used']):
+            if total <= self.max_bytes:
+                break
+            total -= index[key]['bytes']
+            shutil.rmtree(os.path.join(self.folder, key), ignore_errors = True)
+            del index[key]
+        return index
+
+    def clear(self):
+        """Removes every entry from cache"""
+        with self.lock:
+            for key in set(self.read_index()) | set(self.entries()):
+                shutil.rmtree(os.path.join(self.folder, key), ignore_errors = True)
+            self.write_index({})
@@ -0,0 +1,164 @@
+from numpy import arange, array, asarray, atleast_1d, full, isfinite, nan, ndim, ones, unique
+from fishrespy import MO2Calculate
+
+#columns of MO2Calculate output, with add_ci() columns last
+COLUMNS = MO2Calculate.COLUMNS + ['slope_lo', 'slope_hi', 'MO2_lo', 'MO2_hi']
+
+class ResultsModel:
+    """
+    Editable results of one experiment, one array per column, behind the
+    results table and its plots.  Each derived column records the columns it
+    is calculated from (MO2 from slope, mass and volume, the MO2 interval from
+    the slope interval), so setting mass or volume of some rows recomputes
+    MO2 of those rows only, from the fitted slope, with no re-parse or re-fit.
+    Cycles can be excluded and included again; running sums of MO2 and temp
+    over the included cycles are adjusted for just the rows changed, so
+    summary() is up to date after every edit.  Functions passed to
+    subscribe() are called with the names of the columns changed and the
+    rows changed after every edit.
+
+    Inputs:
+        rows - list of rows in the layout of MO2Calculate.get_data() values
+        columns - name of each column of rows, default COLUMNS to the length of a row
+        volume - volume of chamber, one value or one per row.  Default None
+                 (unknown), MO2 is then left as it is until volume is set
+    """
+    DERIVED = {'MO2': 'slope', 'MO2_lo': 'slope_hi', 'MO2_hi': 'slope_lo'}
+    #column mapped to the name of its sd in summary()
+    SUMMARY = {'MO2': 'sdMO2', 'meanTemp': 'sdMeanTemp'}
+
+    def __init__(self, rows, columns = None, volume = None):
+        rows = list(rows)
+        if columns is None:
+            columns = COLUMNS[:len(rows[0]) if rows else 7]
+        self.columns = list(columns) + ['volume']
+        self.n = len(rows)
+        self.values = {}
+        for c, name in enumerate(columns):
+            values = [row[c] for row in rows]
+            try:
+                self.values[name] = array(values, dtype = float)
+            except (TypeError, ValueError):
+                self.values[name] = array(values, dtype = object)
+        self.values['volume'] = full(self.n, nan if volume is None else volume, dtype = float)
+        self.included = ones(self.n, dtype = bool)
+        #input column mapped to the derived columns calculated from it
+        self.depends = {}
+        for name, source in self.DERIVED.items():
+            if name in self.values and source in self.values:
+                for column in (source, 'mass', 'volume'):
+                    self.depends.setdefault(column, []).append(name)
+        #count, sum and sum of squares of included finite values, less shift to keep precision
+        self.shift = {}
+        self.sums = {}
+        for name in self.SUMMARY:
+            if name in self.values:
+                finite = self.values[name][isfinite(self.values[name])]
+                self.shift[name] = finite[0] if len(finite) else 0.
+                self.sums[name] = [0, 0., 0.]
+                self.adjust(name, arange(self.n), 1)
+        self.listeners = []
+
+    @classmethod
+    def from_calc(cls, calc):
+        """Model of the output of MO2Calculate calc, with its volume"""
+        output = calc.get_data()
+        return cls([output[key] for key in range(len(output))], calc.columns, calc.volume)
+
+    def __len__(self):
+        return self.n
+
+    def subscribe(self, callback):
+        """Calls callback(columns, rows) after every change"""
+        self.listeners.append(callback)
+
+    def notify(self, columns, rows):
+        for callback in self.listeners:
+            callback(columns, rows)
+
+    def get(self, r, name):
+        value = self.values[name][r]
+        return value.item() if hasattr(value, 'item') else value
+
+    def row(self, r):
+        return [self.get(r, name) for name in self.columns]
+
+    def column(self, name):
+        return self.values[name]
+
+    def index(self, rows):
+        """
+        Returns sorted array of row indices from index, list, slice or boolean
+        mask, each row once so it is only counted once in the running sums
+        """
+        return self.unique(rows)[0]
+
+    def unique(self, rows):
+        """index() and the position in rows of the first mention of each of its rows"""
+        return unique(atleast_1d(arange(self.n)[rows]), return_index = True)
+
+    def adjust(self, name, rows, sign):
+        """Adds (sign 1) or removes (sign -1) included values of rows from the running sums of name"""
+        v = self.values[name][rows[self.included[rows]]]
+        v = v[isfinite(v)] - self.shift[name]
+        s = self.sums[name]
+        s[0] += sign * len(v)
+        s[1] += sign * v.sum()
+        s[2] += sign * (v * v).sum()
+
+    def set(self, name, rows, value):
+        """
+        Sets column name of rows (index, list, slice or mask) to value, one
+        value or one per row, then recomputes the columns depending on it for
+        those rows.  Derived columns cannot be set, raises ValueError.
+        """
+        if name in self.DERIVED and name in self.depends.get('mass', []):
+            raise ValueError('%s is calculated from %s, mass and volume' % (name, self.DERIVED[name]))
+        rows, first = self.unique(rows)
+        if ndim(value):
+            #one value per row as given, the first value of a row given twice
+            value = asarray(value)[first]
+        changed = [name] + self.depends.get(name, [])
+        summed = [c for c in changed if c in self.sums]
+        for c in summed:
+            self.adjust(c, rows, -1)
+        self.values[name][rows] = value
+        for c in changed[1:]:
+            #MO2 is only recomputed where volume is known
+            known = rows[isfinite(self.values['volume'][rows])]
+            self.values[c][known] = MO2Calculate.O2consumption(self.values[self.DERIVED[c]][known],
+                                                               self.values['mass'][known],
+                                                               self.values['volume'][known])
+        for c in summed:
+            self.adjust(c, rows, 1)
+        self.notify(changed, rows)
+
+    def set_included(self, rows, included = True):
+        """Includes (or excludes, included False) rows in summary() and plots"""
+        rows = self.index(rows)
+        rows = rows[self.included[rows] != included]
+        if not len(rows):
+            return
+        for name in self.sums:
+            self.adjust(name, rows, -1)
+        self.included[rows] = included
+        for name in self.sums:
+            self.adjust(name, rows, 1)
+        self.notify(['included'], rows)
+
+    def masked(self, name, rows = None):
+        """Returns float values of name (of rows if given) with excluded rows as NaN"""
+        rows = arange(self.n) if rows is None else self.index(rows)
+        values = self.values[name][rows].astype(float)
+        values[~self.included[rows]] = nan
+        return values
+
+    def summary(self):
+        """Returns dict of count, mean and sd of MO2 and mean temp of included cycles"""
+        result = {'cycles': self.n, 'included': int(self.included.sum())}
+        for name, (n, s, ss) in self.sums.items():
+            mean = self.shift[name] + s / n if n else nan
+            sd = max(ss - s * s / n, 0.) / (n - 1) if n > 1 else nan
+            result[name] = float(mean)
+            result[self.SUMMARY[name]] = float(sd) ** 0.5
+        return result
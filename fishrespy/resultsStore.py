@@ -0,0 +1,269 @@
+import os
+import csv
+import sys
+import sqlite3
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from numpy import array, asarray, diff, repeat, arange
+from fishrespy import RawFileParse, MO2Calculate, CycleData, check_start_time, check_start_date, check_cycle_time
+from batchRun import read_manifest, run_one
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    fish TEXT,
+    chamber TEXT,
+    start_time TEXT,
+    start_date TEXT,
+    cycle_time INTEGER NOT NULL,
+    mass REAL NOT NULL,
+    volume REAL NOT NULL,
+    added TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cycles (
+    experiment INTEGER NOT NULL REFERENCES experiments(id) ON DELETE CASCADE,
+    cycle INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    slope REAL,
+    R2 REAL,
+    MO2 REAL,
+    mass REAL,
+    meanTemp REAL,
+    sdTemp REAL,
+    PRIMARY KEY (experiment, cycle)
+);
+CREATE TABLE IF NOT EXISTS samples (
+    experiment INTEGER NOT NULL REFERENCES experiments(id) ON DELETE CASCADE,
+    cycle INTEGER NOT NULL,
+    epoch INTEGER NOT NULL,
+    O2 REAL,
+    tempC REAL
+);
+CREATE INDEX IF NOT EXISTS experiments_fish ON experiments (fish);
+CREATE INDEX IF NOT EXISTS experiments_chamber ON experiments (chamber);
+CREATE INDEX IF NOT EXISTS cycles_start ON cycles (start);
+CREATE INDEX IF NOT EXISTS cycles_meanTemp ON cycles (meanTemp);
+CREATE INDEX IF NOT EXISTS samples_cycle ON samples (experiment, cycle);
+"""
+
+#columns returned by ResultsStore.query(), start is seconds since 01/01/1970
+COLUMNS = ('experiment', 'cycle', 'start', 'slope', 'R2', 'MO2', 'mass', 'meanTemp', 'sdTemp')
+
+def to_epoch(value):
+    """Returns seconds since 01/01/1970 of a 'dd/mm/yy HH:MM:SS' string, or of a number as int"""
+    if isinstance(value, str):
+        return int((datetime.strptime(value, CycleData.DATETIME_FORMAT) - CycleData.EPOCH).total_seconds())
+    return int(value)
+
+class ResultsStore:
+    """
+    Results of many experiments in one SQLite database file: one row per
+    raw file in experiments (file, fish, chamber, start time and date, cycle
+    time in seconds, mass and volume), one row per closed cycle in cycles,
+    and optionally every sample of each close in samples.  Rows are loaded
+    with executemany in one transaction per experiment, and cycles are
+    indexed on start and temp (experiments on fish and chamber), so
+    queries across hundreds of fish read only the matching rows.  Queries
+    return NumPy arrays.
+
+    Inputs:
+        path - database file, created if it does not exist
+    """
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        #one writer, many readers; commits do not wait for the disk on every write
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def add_experiment(self, file, start_time, start_date, cycle_time, mass, volume, fish = None, chamber = None):
+        """Adds a row to experiments, returns its id.  Commit is left to the caller"""
+        cur = self.conn.execute('INSERT INTO experiments (file, fish, chamber, start_time, start_date, '
+                                'cycle_time, mass, volume, added) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                (os.path.abspath(file), fish, chamber, start_time, start_date,
+                                 cycle_time[0] * 60 + cycle_time[1], mass, volume,
+                                 datetime.now().strftime(CycleData.DATETIME_FORMAT)))
+        return cur.lastrowid
+
+    def add_rows(self, experiment, rows):
+        """
+        Adds rows in the layout of MO2Calculate.get_data() values ([slope, R2,
+        start, MO2, mass, meanTemp, sdTemp]) to cycles, numbered from 0 in
+        order.  start may be the date and time string or epoch seconds.
+        """
+        self.conn.executemany('INSERT INTO cycles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                              ((experiment, c, to_epoch(row[2]), float(row[0]), float(row[1]), float(row[3]),
+                                float(row[4]), float(row[5]), float(row[6])) for c, row in enumerate(rows)))
+
+    def add_samples(self, experiment, data):
+        """Adds every sample of each closed cycle of CycleData data to samples"""
+        cycle = repeat(arange(len(data)), diff(data.offsets))
+        n = data.offsets[-1]
+        self.conn.executemany('INSERT INTO samples VALUES (?, ?, ?, ?, ?)',
+                              zip([experiment] * n, cycle.tolist(), data.epoch[:n].tolist(), data.O2[:n].tolist(),
+                                  data.tempC[:n].tolist()))
+
+    def add(self, calc, file, start_time, start_date, fish = None, chamber = None, samples = False):
+        """
+        Stores MO2Calculate calc of raw file (its cycles, and its samples if
+        samples is True) as a new experiment in one transaction.  Returns the
+        experiment id.
+        """
+        with self.conn:
+            experiment = self.add_experiment(file, start_time, start_date, calc.cycle_time, calc.mass,
+                                             calc.volume, fish, chamber)
+            output = calc.get_data()
+            start = calc.data.epoch[calc.data.offsets[:-1]].tolist()
+            self.add_rows(experiment, [output[c][:2] + [start[c]] + output[c][3:] for c in range(len(output))])
+            if samples:
+                self.add_samples(experiment, calc.data)
+        return experiment
+
+    def add_manifest(self, manifest, workers = None):
+        """
+        Calculates every entry of a batchRun.py manifest (fish and chamber are
+        taken from the entries that have them) in a pool of worker processes
+        (default one per core) and stores each as an experiment, this process
+        doing all the writes.  Returns list of experiment ids in manifest order.
+        """
+        if workers == 1:
+            results = map(run_one, manifest)
+        else:
+            with ProcessPoolExecutor(max_workers = workers) as pool:
+                results = list(pool.map(run_one, manifest))
+        ids = []
+        for entry, rows in zip(manifest, results):
+            with self.conn:
+                experiment = self.add_experiment(entry['file'], entry['start_time'], entry['start_date'],
+                                                 entry['cycle_time'], entry['mass'], entry['volume'],
+                                                 entry.get('fish'), entry.get('chamber'))
+                self.add_rows(experiment, [row[2:] for row in rows])
+            ids.append(experiment)
+        return ids
+
+    def delete(self, experiment):
+        """Removes an experiment with its cycles and samples"""
+        with self.conn:
+            self.conn.execute('DELETE FROM experiments WHERE id = ?', (int(experiment),))
+
+    def experiments(self, **where):
+        """Returns list of dicts of the experiments matching fish and chamber (see query())"""
+        sql, args = self.where(**where)
+        cur = self.conn.execute('SELECT * FROM experiments e WHERE ' + sql, args)
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names, row)) for row in cur]
+
+    def where(self, fish = None, chamber = None, experiment = None, start = None, end = None,
+              min_temp = None, max_temp = None, min_R2 = None):
+        """Returns SQL condition and arguments of the query() filters"""
+        terms, args = ['1'], []
+        for column, value, convert in (('e.fish', fish, str), ('e.chamber', chamber, str),
+                                       ('e.id', experiment, int)):
+            if value is None:
+                continue
+            values = [value] if isinstance(value, (str, int)) else list(value)
+            terms.append('%s IN (%s)' % (column, ', '.join('?' * len(values))))
+            args.extend(convert(v) for v in values)
+        for term, value, convert in (('c.start >= ?', start, to_epoch), ('c.start < ?', end, to_epoch),
+                                     ('c.meanTemp >= ?', min_temp, float), ('c.meanTemp <= ?', max_temp, float),
+                                     ('c.R2 >= ?', min_R2, float)):
+            if value is not None:
+                terms.append(term)
+                args.append(convert(value))
+        return ' AND '.join(terms), args
+
+    def query(self, **where):
+        """
+        Returns dict of column name (COLUMNS) mapped to array, one value per
+        closed cycle matching every filter given, in order of experiment and
+        cycle.  Filters:
+            fish, chamber, experiment - value or list of values
+            start, end - start of close from start up to end, 'dd/mm/yy
+                         HH:MM:SS' or epoch seconds
+            min_temp, max_temp - mean temp of close
+            min_R2 - R2 of close
+        """
+        sql, args = self.where(**where)
+        rows = self.conn.execute('SELECT %s FROM cycles c JOIN experiments e ON c.experiment = e.id WHERE %s '
+                                 'ORDER BY c.experiment, c.cycle' % (', '.join('c.' + name for name in COLUMNS), sql),
+                                 args).fetchall()
+        columns = list(zip(*rows)) or [()] * len(COLUMNS)
+        return dict((name, array(values, dtype = 'int64' if name in ('experiment', 'cycle', 'start') else float))
+                    for name, values in zip(COLUMNS, columns))
+
+    def samples(self, experiment, cycle = None):
+        """Returns cycle, epoch, O2 and temp arrays of the stored samples of an experiment (one cycle if given)"""
+        sql, args = 'experiment = ?', [int(experiment)]
+        if cycle is not None:
+            sql, args = sql + ' AND cycle = ?', args + [int(cycle)]
+        rows = self.conn.execute('SELECT cycle, epoch, O2, tempC FROM samples WHERE %s ORDER BY rowid' % sql,
+                                 args).fetchall()
+        columns = list(zip(*rows)) or [()] * 4
+        return tuple(asarray(values, dtype = t) for values, t in zip(columns, ('int64', 'int64', float, float)))
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Store results of many experiments in a SQLite database and '
+                                                   'query them')
+    parser.add_argument('database', help = 'SQLite database file')
+    commands = parser.add_subparsers(dest = 'command')
+    add = commands.add_parser('add', help = 'calculate and store one raw file')
+    add.add_argument('file', help = 'raw file')
+    add.add_argument('start_time', help = 'start time of first close, HH:MM:SS')
+    add.add_argument('start_date', help = 'start date of first close, dd/mm/yy')
+    add.add_argument('cycle_time', help = 'duration of closed cycle, min:sec')
+    add.add_argument('mass', type = float, help = 'fish mass (kg)')
+    add.add_argument('volume', type = float, help = 'respirometer volume (L)')
+    add.add_argument('--fish')
+    add.add_argument('--chamber')
+    add.add_argument('--samples', action = 'store_true', help = 'also store every sample of each close')
+    batch = commands.add_parser('manifest', help = 'calculate and store every raw file of a batchRun.py manifest, '
+                                                   'with optional fish and chamber columns')
+    batch.add_argument('manifest')
+    batch.add_argument('-w', '--workers', type = int, default = None)
+    query = commands.add_parser('query', help = 'write the closed cycles matching every filter given as .csv')
+    query.add_argument('--fish', nargs = '+')
+    query.add_argument('--chamber', nargs = '+')
+    query.add_argument('--start', help = 'dd/mm/yy HH:MM:SS')
+    query.add_argument('--end', help = 'dd/mm/yy HH:MM:SS')
+    query.add_argument('--min-temp', type = float)
+    query.add_argument('--max-temp', type = float)
+    query.add_argument('--min-R2', type = float)
+    query.add_argument('-o', '--output', help = 'results .csv (default: write to stdout)')
+    args = parser.parse_args()
+
+    with ResultsStore(args.database) as store:
+        if args.command == 'add':
+            cycle_time = check_cycle_time(args.cycle_time)
+            start_time, start_date = check_start_time(args.start_time), check_start_date(args.start_date)
+            data = RawFileParse(args.file, start_time, start_date, cycle_time).get_data()
+            calc = MO2Calculate(data, args.mass, args.volume, cycle_time)
+            print(store.add(calc, args.file, start_time, start_date, args.fish, args.chamber, args.samples))
+        elif args.command == 'manifest':
+            store.add_manifest(read_manifest(args.manifest), args.workers)
+        elif args.command == 'query':
+            result = store.query(fish = args.fish, chamber = args.chamber, start = args.start, end = args.end,
+                                 min_temp = args.min_temp, max_temp = args.max_temp, min_R2 = args.min_R2)
+            f = open(args.output, 'w', newline = '') if args.output else sys.stdout
+            w = csv.writer(f)
+            w.writerow(COLUMNS)
+            w.writerows(zip(*[result[name].tolist() for name in COLUMNS]))
+            if f is not sys.stdout:
+                f.close()
+        else:
+            parser.error('command is required: add, manifest or query')
+
+if __name__ == '__main__':
+    main()
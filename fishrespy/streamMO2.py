@@ -0,0 +1,206 @@
+import sys
+import csv
+import time
+import argparse
+from numpy import concatenate, diff, all as np_all
+from fishrespy import RawFileParse, MO2Calculate, CycleData, InputError, check_start_time, check_start_date, check_cycle_time
+
+class CycleBinner:
+    """
+    Bins samples into closed cycles as they arrive, block by block, with the
+    same rules as RawFileParse.bin_samples().  Only the samples of the open
+    cycle are held.  As in bin_samples(), once a start or end time is passed
+    without being found no more closes are binned, and nothing more is held.
+
+    Inputs:
+        parser - RawFileParse holding start_time, start_date and cycle_time
+    """
+    def __init__(self, parser):
+        self.parser = parser
+        self.cycle = parser.cycle_time[0] * 60 + parser.cycle_time[1]
+        self.start_sec = parser.start_seconds()
+        self.end_sec = None
+        self.first = True
+        self.record = False
+        self.done = False
+        self.open = []
+
+    def find_start(self, epoch, lo, ordered):
+        """Returns index of start of next close at or after lo, or -1"""
+        if self.first:
+            i = self.parser.find_first(epoch, lo)
+            self.first = i < 0
+            return i
+        return self.parser.find_time(epoch, lo, self.start_sec, ordered)
+
+    def feed(self, epoch, O2, tempC):
+        """
+        Add a block of samples (arrays of epoch seconds, O2 and temp).  Returns
+        list with a tuple of epoch, O2 and temp arrays for each close which
+        ended in the block.
+        """
+        closes = []
+        ordered = bool(np_all(diff(epoch) >= 0))
+        lo, search = 0, 0
+        while lo < len(epoch) and not self.done:
+            if not self.record:
+                lo = self.find_start(epoch, lo, ordered)
+                if lo < 0:
+                    self.done = not self.first and ordered and epoch[-1] > self.start_sec + 1
+                    break
+                self.record = True
+                self.end_sec = self.start_sec + self.cycle
+                search = lo + 1
+            end = self.parser.find_time(epoch, search, self.end_sec, ordered)
+            if end < 0 and ordered and epoch[-1] > self.end_sec + 1:
+                #end time missing from the file, the close is dropped
+                self.open = []
+                self.done = True
+                break
+            if end < 0:
+                self.open.append((epoch[lo:], O2[lo:], tempC[lo:]))
+                break
+            self.open.append((epoch[lo:end], O2[lo:end], tempC[lo:end]))
+            closes.append(tuple(concatenate(col) for col in zip(*self.open)))
+            self.open = []
+            self.record = False
+            self.start_sec = self.end_sec + self.cycle
+            lo = end + 1
+        return closes
+
+
+class StreamMO2:
+    """
+    Follows a raw file from PreSens Oxyview while the instrument is still
+    writing it and calculates oxygen consumption for each closed cycle as soon
+    as the end time of the close is seen.  Iterating over the class yields one
+    row per closed cycle in the format of MO2Calculate.get_data() values
+    ([slope, R2, start, MO2, mass, meanTemp, sdTemp]).  Memory use is constant,
+    only the samples of the open cycle are held.  With follow False this is
+    the bounded memory way to process a finished file of any length, see
+    save_data().
+
+    Inputs:
+        file - directory path to raw file, string.  None if blocks of lines are
+               passed to feed() instead (see ingestService.py)
+        start_time - start time for first closed cycle, string
+        start_date - start date for first closed cycle, string
+        cycle_time - duration of closed cycle, list or tuple [minutes, seconds]
+        mass - mass of fish
+        volume - volume of chamber
+        follow - wait for more lines at end of file, default True.  If False
+                 stop at end of file
+        poll - seconds between checks for new lines at end of file
+        idle - stop following after this many seconds without new lines,
+               default None (follow until stop() is called)
+    """
+    def __init__(self, file, start_time, start_date, cycle_time, mass, volume,
+                 follow = True, poll = 0.25, idle = None):
+        self.parser = RawFileParse(file, start_time, start_date, cycle_time, extract = False)
+        self.binner = CycleBinner(self.parser)
+        self.file = file
+        self.cycle_time = cycle_time
+        self.mass = mass
+        self.volume = volume
+        self.follow = follow
+        self.poll = poll
+        self.idle = idle
+        self.running = True
+
+    def stop(self):
+        """Stop following the file, iteration ends after the current block"""
+        self.running = False
+
+    def read_chunks(self):
+        """
+        Generator yielding blocks of bytes from file, each ending on a line
+        boundary.  At end of file waits for the file to grow if following.
+        """
+        rest = b''
+        waited = 0
+        with open(self.file, 'rb') as f:
+            while self.running:
+                chunk = f.read(self.parser.CHUNK_SIZE)
+                if not chunk:
+                    if not self.follow or (self.idle is not None and waited >= self.idle):
+                        break
+                    time.sleep(self.poll)
+                    waited += self.poll
+                    continue
+                waited = 0
+                chunk = rest + chunk
+                cut = chunk.rfind(b'\n') + 1
+                rest = chunk[cut:]
+                if cut:
+                    yield chunk[:cut]
+        if rest:
+            yield rest
+
+    def calculate(self, epoch, O2, tempC):
+        """Returns summary statistics of a single closed cycle"""
+        return self.calculate_all([(epoch, O2, tempC)])[0]
+
+    def calculate_all(self, closes):
+        """Returns list of summary statistics of each closed cycle in closes, fitted together"""
+        offsets = [0]
+        for epoch, O2, tempC in closes:
+            offsets.append(offsets[-1] + len(epoch))
+        data = CycleData(*[concatenate(col) for col in zip(*closes)] + [offsets])
+        output = MO2Calculate(data, self.mass, self.volume, self.cycle_time).get_data()
+        return [output[key] for key in range(len(closes))]
+
+    def feed(self, chunk):
+        """Parses a block of bytes ending on a line boundary, returns rows of the closes which ended in it"""
+        closes = self.binner.feed(*self.parser.parse_chunk(chunk))
+        return self.calculate_all(closes) if closes else []
+
+    def __iter__(self):
+        #a finished file is read by the parser, which also reads compressed files
+        chunks = self.read_chunks() if self.follow else self.parser.read_chunks()
+        for chunk in chunks:
+            for row in self.feed(chunk):
+                yield row
+
+    def save_data(self, file, buffering = 1 << 20):
+        """
+        Writes a row to .csv file with header for each closed cycle as it is
+        calculated, through a write buffer of buffering bytes, and returns the
+        number of rows.  Nothing is kept once written, so memory use does not
+        grow with the length of the file.
+        """
+        rows = 0
+        with open(file, 'w', newline = '', buffering = buffering) as f:
+            w = csv.writer(f)
+            w.writerow(MO2Calculate.COLUMNS)
+            for row in self:
+                w.writerow(row)
+                rows += 1
+        return rows
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Print MO2 for each closed cycle of a raw file as it is written')
+    parser.add_argument('file')
+    parser.add_argument('start_time', help = 'HH:MM:SS')
+    parser.add_argument('start_date', help = 'dd/mm/yy')
+    parser.add_argument('cycle_time', help = 'min:sec')
+    parser.add_argument('mass', type = float)
+    parser.add_argument('volume', type = float)
+    parser.add_argument('--idle', type = float, default = None,
+                        help = 'stop after this many seconds without new data')
+    args = parser.parse_args()
+    try:
+        start_time = check_start_time(args.start_time)
+        start_date = check_start_date(args.start_date)
+        cycle_time = check_cycle_time(args.cycle_time)
+    except InputError as e:
+        parser.error('%s: %s' % (e.title, e.message.replace('\n', ', ')))
+
+    w = csv.writer(sys.stdout)
+    w.writerow(MO2Calculate.COLUMNS)
+    for row in StreamMO2(args.file, start_time, start_date, cycle_time,
+                         args.mass, args.volume, idle = args.idle):
+        w.writerow(row)
+        sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+import csv
+import sys
+import heapq
+import argparse
+from math import log
+from concurrent.futures import ProcessPoolExecutor
+from numpy import asarray, ceil as np_ceil, isfinite, log as np_log, unique
+from batchRun import read_manifest, run_one
+
+#rows added at a time by add_rows(), bounds memory when rows come from a generator
+BATCH = 4096
+
+class Moments:
+    """
+    Running count, mean, variance, min and max (Welford), updated a batch of
+    values at a time and merged with another Moments by the pairwise
+    formula of Chan et al., so partial results of files or workers combine
+    to the same values as one pass over everything.
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.
+        self.M2 = 0.
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def combine(self, n, mean, M2, low, high):
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.M2 += M2 + delta * delta * self.n * n / total
+        self.n = total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+
+    def add(self, values):
+        """Adds array of values, NaN and inf are left out"""
+        values = asarray(values, dtype = float)
+        values = values[isfinite(values)]
+        if len(values):
+            m = values.mean()
+            self.combine(len(values), m, ((values - m) ** 2).sum(), values.min(), values.max())
+
+    def merge(self, other):
+        self.combine(other.n, other.mean, other.M2, other.min, other.max)
+
+    def sd(self):
+        """Sample standard deviation, as numpy std(ddof = 1)"""
+        return (self.M2 / (self.n - 1)) ** 0.5 if self.n > 1 else float('nan')
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative error (DDSketch, Masson et al.
+    2019).  Values are counted in logarithmic buckets, one per factor gamma =
+    (1 + accuracy) / (1 - accuracy), so any quantile is returned within
+    accuracy (default 1%) of the true value and the number of buckets only
+    depends on the range of values (about 460 for MO2 of 0.1 to 10000), not
+    on how many are added.  Merging adds bucket counts, so the result does not
+    depend on how values were split between sketches.  Values with magnitude
+    below min_value count as zero.
+    """
+    def __init__(self, accuracy = 0.01, min_value = 1e-9):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = log(self.gamma)
+        self.min_value = min_value
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0
+        self.n = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def count(self, store, values):
+        keys, counts = unique(np_ceil(np_log(values) / self.log_gamma).astype('int64'), return_counts = True)
+        for key, c in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + c
+
+    def add(self, values):
+        """Adds array of values, NaN and inf are left out"""
+        values = asarray(values, dtype = float)
+        values = values[isfinite(values)]
+        if not len(values):
+            return
+        self.count(self.positive, values[values >= self.min_value])
+        self.count(self.negative, -values[values <= -self.min_value])
+        self.zero += int((abs(values) < self.min_value).sum())
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError('sketches with different accuracy cannot be merged')
+        for store, more in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, c in more.items():
+                store[key] = store.get(key, 0) + c
+        self.zero += other.zero
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def value(self, key):
+        """Middle of bucket key, within accuracy of every value in it"""
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Returns estimate of quantile q (0 to 1) of the values added, NaN if none"""
+        if self.n == 0:
+            return float('nan')
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.n - 1)
+        seen = 0
+        #negative values in increasing order are the largest magnitudes first
+        for key in sorted(self.negative, reverse = True):
+            seen += self.negative[key]
+            if seen > rank:
+                return max(-self.value(key), self.min)
+        seen += self.zero
+        if seen > rank:
+            return 0.
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return min(self.value(key), self.max)
+        return self.max
+
+class Extremes:
+    """
+    The k lowest and k highest values added, each with a label (e.g. start of
+    the close), kept in two heaps of k so memory does not grow with the
+    number added.  Merging keeps the k lowest and highest of both.
+    """
+    def __init__(self, k = 10):
+        self.k = k
+        self.low = []
+        self.high = []
+        #ties are broken by order added, labels are never compared
+        self.added = 0
+
+    def add(self, values, labels = None):
+        """Adds array of values with a list of labels (default None for each), NaN and inf are left out"""
+        values = asarray(values, dtype = float)
+        if labels is None:
+            labels = [None] * len(values)
+        keep = isfinite(values)
+        #only the k lowest and highest of the batch can enter the heaps
+        if keep.sum() > 2 * self.k:
+            order = values.argsort()
+            order = order[keep[order]]
+            keep[:] = False
+            keep[order[:self.k]] = keep[order[-self.k:]] = True
+        for i in keep.nonzero()[0].tolist():
+            #low is a max heap by negated value, high a min heap
+            self.push(self.low, -float(values[i]), labels[i])
+            self.push(self.high, float(values[i]), labels[i])
+
+    def push(self, heap, value, label):
+        self.added += 1
+        if len(heap) < self.k:
+            heapq.heappush(heap, (value, self.added, label))
+        elif value > heap[0][0]:
+            heapq.heapreplace(heap, (value, self.added, label))
+
+    def merge(self, other):
+        for value, label in other.lowest():
+            self.push(self.low, -value, label)
+        for value, label in other.highest():
+            self.push(self.high, value, label)
+
+    def lowest(self):
+        """Returns list of (value, label) of the lowest values, lowest first"""
+        return [(-value, label) for value, i, label in sorted(self.low, reverse = True)]
+
+    def highest(self):
+        """Returns list of (value, label) of the highest values, highest first"""
+        return [(value, label) for value, i, label in sorted(self.high, reverse = True)]
+
+class Aggregate:
+    """Moments of MO2 and temp, quantile sketch and extremes of MO2 for one group of closed cycles"""
+    def __init__(self, k = 10, accuracy = 0.01):
+        self.MO2 = Moments()
+        self.tempC = Moments()
+        self.sketch = QuantileSketch(accuracy)
+        self.extremes = Extremes(k)
+
+    def add(self, MO2, tempC, labels):
+        self.MO2.add(MO2)
+        self.tempC.add(tempC)
+        self.sketch.add(MO2)
+        self.extremes.add(MO2, labels)
+
+    def merge(self, other):
+        self.MO2.merge(other.MO2)
+        self.tempC.merge(other.tempC)
+        self.sketch.merge(other.sketch)
+        self.extremes.merge(other.extremes)
+
+    def result(self, quantiles):
+        lowest = [value for value, label in self.extremes.lowest()]
+        highest = self.extremes.highest()
+        result = {'n': self.MO2.n, 'mean': self.MO2.mean if self.MO2.n else float('nan'), 'sd': self.MO2.sd()}
+        for q in quantiles:
+            result['q%g' % (q * 100)] = self.sketch.quantile(q)
+        result['meanLowest'] = sum(lowest) / len(lowest) if lowest else float('nan')
+        result['MMR'] = highest[0][0] if highest else float('nan')
+        result['MMRstart'] = highest[0][1] if highest else None
+        result['meanTemp'] = self.tempC.mean if self.tempC.n else float('nan')
+        result['sdTemp'] = self.tempC.sd()
+        return result
+
+class MO2Summary:
+    """
+    Whole experiment summary of MO2 built up from rows of closed cycles as
+    they are calculated, without holding the rows: mean and sd of MO2 and
+    temp, quantiles of MO2 (SMR as a low quantile, e.g. q20), mean of the k
+    lowest MO2 (SMR as mean of lowest k) and the highest MO2 (MMR) with the
+    start of its close.  The same is kept for the closes with R2 of at least
+    each value in min_R2.  Summaries of different files or workers are
+    combined with merge().  Memory does not depend on the number of rows.
+
+    Inputs:
+        min_R2 - R2 thresholds for filtered summaries, default (0.95,)
+        k - number of lowest and highest MO2 kept, default 10
+        quantiles - quantiles reported by result(), default 0.1, 0.2 and 0.5
+        accuracy - relative accuracy of the quantiles, see QuantileSketch
+    """
+    def __init__(self, min_R2 = (0.95,), k = 10, quantiles = (0.1, 0.2, 0.5), accuracy = 0.01):
+        self.quantiles = quantiles
+        self.all = Aggregate(k, accuracy)
+        self.filtered = dict((r, Aggregate(k, accuracy)) for r in min_R2)
+
+    def add(self, R2, MO2, tempC, labels = None):
+        """Adds arrays of R2, MO2 and mean temp of a batch of closed cycles, labels as Extremes.add()"""
+        R2, MO2, tempC = asarray(R2, dtype = float), asarray(MO2, dtype = float), asarray(tempC, dtype = float)
+        if labels is None:
+            labels = [None] * len(MO2)
+        self.all.add(MO2, tempC, labels)
+        for r, group in self.filtered.items():
+            keep = R2 >= r
+            group.add(MO2[keep], tempC[keep], [label for label, k in zip(labels, keep) if k])
+
+    def add_rows(self, rows, label = None):
+        """
+        Adds rows in the layout of MO2Calculate.get_data() values ([slope, R2,
+        start, MO2, mass, meanTemp, sdTemp]), from any iterable (e.g.
+        StreamMO2), BATCH rows at a time.  Each row is labelled with its start,
+        or (label, start) if label (e.g. the raw file) is given.
+        """
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == BATCH:
+                self.add_batch(batch, label)
+                batch = []
+        if batch:
+            self.add_batch(batch, label)
+
+    def add_batch(self, rows, label):
+        starts = [row[2] for row in rows]
+        self.add([row[1] for row in rows], [row[3] for row in rows], [row[5] for row in rows],
+                 starts if label is None else [(label, start) for start in starts])
+
+    def add_output(self, output, label = None):
+        """Adds MO2Calculate.get_data() dictionary"""
+        self.add_rows((output[key] for key in range(len(output))), label)
+
+    def merge(self, other):
+        """Adds the closes summarised by other, a MO2Summary with the same min_R2"""
+        self.all.merge(other.all)
+        for r, group in self.filtered.items():
+            group.merge(other.filtered[r])
+        return self
+
+    def result(self):
+        """Returns dict of group ('all', 'R2>=0.95', ...) mapped to dict of summary statistics"""
+        results = {'all': self.all.result(self.quantiles)}
+        for r, group in self.filtered.items():
+            results['R2>=%g' % r] = group.result(self.quantiles)
+        return results
+
+def summarise_one(args):
+    """Worker for summarise_batch(), returns MO2Summary of one manifest entry"""
+    entry, min_R2, k = args
+    summary = MO2Summary(min_R2, k)
+    summary.add_rows([row[2:] for row in run_one(entry)], entry['file'])
+    return summary
+
+def summarise_batch(manifest, workers = None, min_R2 = (0.95,), k = 10):
+    """
+    Summarises every entry of a batchRun manifest in a pool of worker processes
+    (default one per core), each returning the MO2Summary of one file, and
+    returns them merged.  Only the summaries are sent back, not the rows.
+    """
+    summary = MO2Summary(min_R2, k)
+    jobs = [(entry, min_R2, k) for entry in manifest]
+    if workers == 1:
+        parts = map(summarise_one, jobs)
+    else:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            parts = list(pool.map(summarise_one, jobs))
+    for part in parts:
+        summary.merge(part)
+    return summary
+
+def read_results(file):
+    """Yields rows of a results .csv (from save_data(), batchRun.py or ingestService.py) one at a time"""
+    with open(file, 'r', newline = '') as f:
+        r = csv.reader(f)
+        header = next(r)
+        cols = [header.index(name) for name in ('slope', 'R2', 'start', 'MO2', 'mass', 'meanTemp', 'sdTemp')]
+        for line in r:
+            row = [line[c] for c in cols]
+            for c in (0, 1, 3, 4, 5, 6):
+                row[c] = float(row[c])
+            yield row
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Summarise MO2 (SMR, MMR and quantiles) of results files, '
+                                                   'or of every raw file of a batchRun.py manifest')
+    parser.add_argument('files', nargs = '+', help = 'results .csv files, or one manifest with --manifest')
+    parser.add_argument('--manifest', action = 'store_true', help = 'files is a batchRun.py manifest')
+    parser.add_argument('--min-R2', type = float, nargs = '*', default = [0.95],
+                        help = 'R2 thresholds for filtered summaries')
+    parser.add_argument('-k', type = int, default = 10, help = 'number of lowest MO2 averaged')
+    parser.add_argument('-w', '--workers', type = int, default = None,
+                        help = 'with --manifest, number of worker processes (default one per core)')
+    args = parser.parse_args()
+
+    if args.manifest:
+        summary = summarise_batch(read_manifest(args.files[0]), args.workers, tuple(args.min_R2), args.k)
+    else:
+        summary = MO2Summary(tuple(args.min_R2), args.k)
+        for file in args.files:
+            summary.add_rows(read_results(file), file if len(args.files) > 1 else None)
+    results = summary.result()
+    w = csv.writer(sys.stdout)
+    names = list(results['all'])
+    w.writerow(['group'] + names)
+    for group, result in results.items():
+        #labels of a manifest or several files are (file, start)
+        w.writerow([group] + [' '.join(value) if isinstance(value, tuple) else value
+                              for value in (result[name] for name in names)])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import argparse
+from datetime import datetime, timedelta
+from numpy import arange, exp, where, random
+
+HEADER = """PreSens Oxyview PST3-V7.01 (synthetic data from synthData.py)
+DESCRIPTION: {description}
+Start Date: {date}  Start Time: {time}
+Sampling interval: {interval} s
+
+Date; Time; LogTime [min]; Oxygen [mg/L]; Phase [deg]; Amp; Temp [C]; Error;
+"""
+
+def write_raw(file, hours = 24, interval = 1, start = '30/10/13 16:38:30', cycle_time = (10, 0),
+              lead = 300, gap_rate = 0.01, noise = 0.003, decline = 0.003, saturation = 9.0,
+              tempC = 15.0, seed = 0, flush = None):
+    """
+    Writes a raw file in the layout of PreSens Oxyview PST3-V7.01 with a closed
+    cycle of cycle_time followed by a flush of flush seconds, repeated for
+    hours.  O2 falls by decline (mg/L per s) while closed and recovers towards
+    saturation while flushing.  Each close starts as the flush before it ends,
+    so the --skip seconds of fishrespy count from the end of the flush.
+    Returns number of data lines written.
+
+    RawFileParse schedules a flush as long as cycle_time, bin a file with
+    any other flush with detect (--detect).
+
+    Inputs:
+        file - directory path of file to write
+        hours - length of recording
+        interval - seconds between samples
+        start - date and time of first close, 'dd/mm/yy HH:MM:SS'
+        cycle_time - duration of closed cycle, [minutes, seconds]
+        lead - seconds recorded before first close
+        gap_rate - chance of each sample being missing from the file
+        noise - standard deviation of O2 noise (mg/L)
+        decline - O2 consumption during close (mg/L per s)
+        saturation - O2 at the end of a full flush (mg/L)
+        tempC - mean temp (deg C)
+        seed - seed for random number generator
+        flush - seconds of flush between closes, default None (cycle_time)
+    """
+    rng = random.RandomState(seed)
+    first = datetime.strptime(start, '%d/%m/%y %H:%M:%S')
+    begin = first - timedelta(seconds = lead)
+    cycle = cycle_time[0] * 60 + cycle_time[1]
+    if flush is None:
+        flush = cycle
+    total = int(hours * 3600)
+    written = 0
+
+    with open(file, 'w') as f:
+        f.write(HEADER.format(description = 'synthetic %g h recording' % hours, date = first.strftime('%d/%m/%y'),
+                              time = first.strftime('%H:%M:%S'), interval = interval))
+        #one day of samples at a time to bound memory on long recordings
+        for day in range(0, total, 86400):
+            sec = arange(day, min(day + 86400, total), interval)
+            phase = (sec - lead) % (cycle + flush)
+            closed = (sec >= lead) & (phase < cycle)
+            low = saturation - decline * cycle
+            O2 = where(closed, saturation - decline * phase,
+                       saturation + (low - saturation) * exp(-(phase - cycle) / (flush / 5.)))
+            O2 = where(sec < lead, saturation, O2) + rng.normal(0, noise, len(sec))
+            temp = tempC + rng.normal(0, 0.05, len(sec))
+            keep = rng.random_sample(len(sec)) >= gap_rate
+            day_start = begin + timedelta(seconds = int(day))
+            lines = []
+            for s, o, t in zip(sec[keep].tolist(), O2[keep].tolist(), temp[keep].tolist()):
+                dt = day_start + timedelta(seconds = s - day)
+                lines.append('%s; %.2f; %.3f; %.2f; %d; %.2f; 0;\n' % (dt.strftime('%d/%m/%y; %H:%M:%S'), s / 60.,
+                                                                      max(o, 0), 30 + o, 40000, t))
+            f.writelines(lines)
+            written += len(lines)
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Write synthetic PreSens Oxyview raw file')
+    parser.add_argument('file')
+    parser.add_argument('--hours', type = float, default = 24)
+    parser.add_argument('--interval', type = int, default = 1, help = 'seconds between samples')
+    parser.add_argument('--start', default = '30/10/13 16:38:30', help = 'first close, dd/mm/yy HH:MM:SS')
+    parser.add_argument('--cycle-time', default = '10:00', help = 'close duration, min:sec')
+    parser.add_argument('--flush', type = int, help = 'seconds of flush between closes (default: cycle time)')
+    parser.add_argument('--gap-rate', type = float, default = 0.01)
+    parser.add_argument('--noise', type = float, default = 0.003)
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+    cycle_time = tuple(int(x) for x in args.cycle_time.split(':'))
+    n = write_raw(args.file, args.hours, args.interval, args.start, cycle_time,
+                  gap_rate = args.gap_rate, noise = args.noise, seed = args.seed, flush = args.flush)
+    print('%d data lines written to %s' % (n, args.file))
+
+if __name__ == '__main__':
+    main()
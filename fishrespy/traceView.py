@@ -0,0 +1,184 @@
+import argparse
+from numpy import argmax, asarray, linspace, searchsorted, abs as np_abs
+from fishrespy import RawFileParse, MO2Calculate, CycleData, InputError, check_start_time, check_start_date, check_cycle_time
+
+def minmax(x, y, buckets):
+    """
+    Decimates x, y to the lowest and highest y value in each of buckets runs
+    of samples, split evenly as in lttb(), so every peak and trough stays
+    visible when plotted at one bucket per pixel.  Returns the selected x and
+    y, 2 * buckets values, or x and y unchanged when they are already that short.
+    """
+    n = len(y)
+    if n <= 2 * buckets:
+        return x, y
+    y = asarray(y)
+    edges = linspace(0, n, buckets + 1).astype(int).tolist()
+    #each run is a view of y, so nothing is copied
+    index = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        run = y[lo:hi]
+        index.extend(sorted((lo + int(run.argmin()), lo + int(run.argmax()))))
+    return x[index], y[index]
+
+def lttb(x, y, threshold):
+    """
+    Decimates x, y to threshold points by largest triangle three buckets: the
+    first and last points are kept, and from each bucket between them the
+    point making the largest triangle with the point kept from the previous
+    bucket and the mean of the next bucket.  Returns the selected x and y, or
+    x and y unchanged when they have threshold points or fewer.
+    """
+    n = len(y)
+    if n <= threshold or threshold < 3:
+        return x, y
+    edges = linspace(1, n - 1, threshold - 1).astype(int)
+    index = [0]
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            cx, cy = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            cx, cy = x[n - 1], y[n - 1]
+        area = np_abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(argmax(area))
+        index.append(a)
+    index.append(n - 1)
+    return x[index], y[index]
+
+
+class TraceView:
+    """
+    Plot of the raw O2 and temp trace of a whole recording, with the closed
+    cycle windows shaded and the fitted slope of each cycle drawn over the O2.
+    Only the samples in view are plotted, decimated to about two points per
+    pixel by min/max (default) or LTTB, and decimated again whenever the view
+    is panned or zoomed, so traces of millions of samples stay interactive.
+
+    Inputs:
+        samples - epoch seconds, O2 and temp arrays of every sample in the raw
+                  file, as from RawFileParse.get_samples()
+        data - CycleData of the closed cycles, from RawFileParse.get_data()
+        cycle_time - duration of closed cycle, [minutes, seconds]
+        calc - MO2Calculate of data, default None (no fitted lines)
+        method - decimation, 'minmax' or 'lttb'
+    """
+    METHODS = {'minmax': minmax, 'lttb': lttb}
+
+    def __init__(self, samples, data, cycle_time, calc = None, method = 'minmax'):
+        epoch, O2, tempC = samples
+        self.epoch = asarray(epoch)
+        self.O2 = asarray(O2, dtype = float)
+        self.tempC = asarray(tempC, dtype = float)
+        #date numbers of every sample, converted when first plotted and sliced on each redraw
+        self.num = None
+        self.data = data
+        self.cycle_time = cycle_time
+        self.calc = calc
+        self.decimate = self.METHODS[method]
+        self.fig = None
+
+    def to_num(self, sec):
+        """Convert epoch seconds (array) to matplotlib date numbers"""
+        from matplotlib import dates
+        return dates.date2num(CycleData.EPOCH) + asarray(sec, dtype = float) / 86400.
+
+    def windows(self):
+        """Returns start and end (epoch seconds) of each closed cycle"""
+        start = self.data.epoch[self.data.offsets[:-1]]
+        return start, start + self.cycle_time[0] * 60 + self.cycle_time[1]
+
+    def fits(self):
+        """Returns line segments of the fitted O2 slope of each closed cycle"""
+        slope, intercept = self.calc.fit_slopes(self.calc.qc_O2)[:2]
+        start, end = self.windows()
+        n = end - start - 1
+        x0, x1 = self.to_num(start), self.to_num(start + n)
+        return [[(a, b), (c, d)] for a, b, c, d in zip(x0, intercept, x1, intercept + slope * n)]
+
+    def createPlot(self):
+        import matplotlib.pyplot as plt
+        from matplotlib import dates
+        from matplotlib.collections import LineCollection, PolyCollection
+
+        if self.num is None:
+            self.num = self.to_num(self.epoch)
+        self.fig = plt.figure()
+        self.ax = self.fig.add_subplot(211)
+        self.bx = self.fig.add_subplot(212, sharex = self.ax)
+        self.ax.set_ylabel('O2 (mg/L)', fontsize = 10)
+        self.bx.set_ylabel(r'Temp ($^\circ$C)', fontsize = 10)
+        self.bx.set_xlabel('Time', fontsize = 10)
+        self.bx.xaxis.set_major_formatter(dates.DateFormatter('%d/%m %H:%M'))
+        self.fig.autofmt_xdate()
+
+        start, end = self.windows()
+        x0, x1 = self.to_num(start), self.to_num(end)
+        for axis in (self.ax, self.bx):
+            #shaded windows span the full height of each axis whatever its limits
+            boxes = [[(a, 0), (a, 1), (b, 1), (b, 0)] for a, b in zip(x0, x1)]
+            axis.add_collection(PolyCollection(boxes, transform = axis.get_xaxis_transform(),
+                                               facecolor = '0.85', edgecolor = 'none', zorder = 0))
+        if self.calc is not None and len(self.data):
+            self.ax.add_collection(LineCollection(self.fits(), colors = 'r', linewidths = 1.5, zorder = 3))
+
+        self.O2_line, = self.ax.plot([], [], lw = 0.8, zorder = 2)
+        self.temp_line, = self.bx.plot([], [], lw = 0.8, zorder = 2)
+        if len(self.epoch):
+            first, last = self.num[[0, -1]]
+            self.ax.set_xlim(first, last)
+            self.ax.set_ylim(self.O2.min() - 0.1, self.O2.max() + 0.1)
+            self.bx.set_ylim(self.tempC.min() - 0.5, self.tempC.max() + 0.5)
+        self.ax.callbacks.connect('xlim_changed', self.redraw)
+        self.redraw(self.ax)
+
+    def redraw(self, axis):
+        """Decimates the samples in the current x limits of axis to its width in pixels"""
+        if not len(self.epoch):
+            return
+        lo, hi = axis.get_xlim()
+        #one sample either side so lines run to the edge of the view
+        i = max(searchsorted(self.num, lo) - 1, 0)
+        j = min(searchsorted(self.num, hi, 'right') + 1, len(self.num))
+        width = max(int(axis.bbox.width), 100)
+        x = self.num[i:j]
+        self.O2_line.set_data(*self.decimate(x, self.O2[i:j], width))
+        self.temp_line.set_data(*self.decimate(x, self.tempC[i:j], width))
+        self.fig.canvas.draw_idle()
+
+    def show(self, cycle = None):
+        """Shows the plot, zoomed to closed cycle index cycle and either side of it if given"""
+        import matplotlib.pyplot as plt
+        if self.fig is None or not plt.fignum_exists(self.fig.number):
+            self.createPlot()
+        if cycle is not None and 0 <= cycle < len(self.data):
+            start, end = self.windows()
+            n = end[cycle] - start[cycle]
+            self.ax.set_xlim(self.to_num(start[cycle] - n), self.to_num(end[cycle] + n))
+        plt.show()
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Plot the raw O2 and temp trace of an Oxyview file')
+    parser.add_argument('file')
+    parser.add_argument('start_time', help = 'start time of first close, HH:MM:SS')
+    parser.add_argument('start_date', help = 'start date of first close, dd/mm/yy')
+    parser.add_argument('cycle_time', help = 'duration of closed cycle, min:sec')
+    parser.add_argument('--cycle', type = int, help = 'open zoomed in on this closed cycle')
+    parser.add_argument('--method', choices = sorted(TraceView.METHODS), default = 'minmax')
+    args = parser.parse_args()
+    try:
+        start_time = check_start_time(args.start_time)
+        start_date = check_start_date(args.start_date)
+        cycle_time = check_cycle_time(args.cycle_time)
+    except InputError as e:
+        parser.error('%s: %s' % (e.title, e.message.replace('\n', ', ')))
+
+    raw = RawFileParse(args.file, start_time, start_date, cycle_time)
+    data = raw.get_data()
+    #mass and volume only scale MO2, the fitted slopes do not depend on them
+    calc = MO2Calculate(data, 1, 2, cycle_time)
+    TraceView(raw.samples, data, cycle_time, calc, args.method).show(args.cycle)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+#modules import each other as siblings, as when run from the fishrespy folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fishrespy'))
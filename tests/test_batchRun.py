@@ -0,0 +1,33 @@
+import csv
+from synthData import write_raw
+from batchRun import read_manifest, run_batch, run_one
+
+def write_manifest(folder):
+    write_raw(str(folder / 'a.txt'), hours = 1)
+    write_raw(str(folder / 'b.txt'), hours = 1, seed = 1)
+    #truncated in the middle of a line
+    with open(str(folder / 'a.txt'), 'rb') as f:
+        text = f.read()
+    with open(str(folder / 'cut.txt'), 'wb') as f:
+        f.write(text[:len(text) // 2 + 7])
+    file = folder / 'manifest.csv'
+    with open(str(file), 'w', newline = '') as f:
+        w = csv.writer(f)
+        w.writerow(['file', 'start_time', 'start_date', 'cycle_time', 'mass', 'volume'])
+        w.writerow(['a.txt', '16:38:30', '30/10/13', '10:00', '0.61', '5'])
+        w.writerow(['missing.txt', '16:38:30', '30/10/13', '10:00', '0.61', '5'])
+        w.writerow(['cut.txt', '16:38:30', '30/10/13', '10:00', '0.61', '5'])
+        w.writerow(['b.txt', '16:38:30', '31/02/13', '10:00', '0.61', '5'])
+        w.writerow(['b.txt', '16:38:30', '30/10/13', '10:00', '0.61', '5'])
+    return str(file)
+
+def test_failed_entry_does_not_stop_the_batch(tmp_path):
+    manifest = read_manifest(write_manifest(tmp_path))
+    for workers in (1, 2):
+        rows = run_batch(manifest, workers)
+        expected = run_one(manifest[0]) + run_one(manifest[2]) + run_one(manifest[4])
+        assert rows == expected
+        assert len(run_one(manifest[4])) > 0
+        assert [entry['error'] is None for entry in manifest] == [True, False, True, False, True]
+        assert manifest[1]['error'].startswith('FileNotFoundError')
+        assert manifest[3]['error'].startswith('ValueError')
@@ -0,0 +1,46 @@
+import sys
+import csv
+import pytest
+from numpy import array
+import fishrespy
+from fishrespy import RawFileParse, MO2Calculate
+from synthData import write_raw
+
+@pytest.fixture(scope = 'module')
+def calc(tmp_path_factory):
+    raw = str(tmp_path_factory.mktemp('raw') / 'raw.txt')
+    write_raw(raw, hours = 4)
+    return MO2Calculate(RawFileParse(raw, '16:38:30', '30/10/13', (10, 0)).get_data(), 0.61, 5., (10, 0))
+
+@pytest.mark.parametrize('block', [None, 30])
+def test_interval_brackets_fitted_slope(calc, block):
+    ci = calc.confidence_intervals(200, 0.95, block = block, seed = 1)
+    slope = array([row[0] for row in calc.get_data().values()])
+    MO2 = array([row[3] for row in calc.get_data().values()])
+    assert len(ci['slope_lo']) == len(slope) > 0
+    assert (ci['slope_lo'] < slope).all() and (slope < ci['slope_hi']).all()
+    assert (ci['MO2_lo'] < MO2).all() and (MO2 < ci['MO2_hi']).all()
+
+def test_block_bootstrap_is_reproducible_with_seed(calc):
+    a = calc.bootstrap_slopes(calc.qc_O2, 100, block = 30, seed = 7)
+    b = calc.bootstrap_slopes(calc.qc_O2, 100, block = 30, seed = 7)
+    c = calc.bootstrap_slopes(calc.qc_O2, 100, block = 30, seed = 8)
+    assert (a == b).all()
+    assert not (a == c).all()
+    assert a.shape == (len(calc.data), 100)
+    #rows done a few at a time draw the same as all at once
+    assert (calc.bootstrap_slopes(calc.qc_O2, 100, block = 30, seed = 7, chunk = 1) == a).all()
+
+def test_command_line_ci_with_seed(tmp_path, monkeypatch):
+    raw = str(tmp_path / 'raw.txt')
+    write_raw(raw, hours = 2)
+    outputs = []
+    for i in range(2):
+        out = str(tmp_path / ('out%d.csv' % i))
+        monkeypatch.setattr(sys, 'argv', ['fishrespy', raw, '16:38:30', '30/10/13', '10:00', '0.61', '5',
+                                          '--ci', '200', '--block', '30', '--seed', '3', '-o', out])
+        fishrespy.main()
+        with open(out) as f:
+            outputs.append(list(csv.reader(f)))
+    assert outputs[0] == outputs[1]
+    assert outputs[0][0][-4:] == ['slope_lo', 'slope_hi', 'MO2_lo', 'MO2_hi']
@@ -0,0 +1,52 @@
+import bz2
+import gzip
+import lzma
+import pytest
+from fishrespy import RawFileParse
+from synthData import write_raw
+
+def zstd_compress(data):
+    try:
+        from compression import zstd
+        return zstd.compress(data)
+    except ImportError:
+        zstandard = pytest.importorskip('zstandard')
+        return zstandard.ZstdCompressor().compress(data)
+
+COMPRESS = {'gz': gzip.compress, 'bz2': bz2.compress, 'xz': lzma.compress, 'zst': zstd_compress}
+
+@pytest.fixture(scope = 'module')
+def plain(tmp_path_factory):
+    raw = str(tmp_path_factory.mktemp('raw') / 'raw.txt')
+    write_raw(raw, hours = 4)
+    return raw
+
+def parse(file, workers):
+    parser = RawFileParse(file, '16:38:30', '30/10/13', (10, 0), extract = False, workers = workers)
+    #small blocks so the plain file is big enough to be split between workers
+    parser.CHUNK_SIZE = 1 << 14
+    return parser.extract_data()
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('kind', sorted(COMPRESS))
+def test_compressed_file_gives_same_cycles(plain, tmp_path, kind, workers):
+    with open(plain, 'rb') as f:
+        data = COMPRESS[kind](f.read())
+    #named .txt, the compression is found from the first bytes
+    file = str(tmp_path / ('raw.%s.txt' % kind))
+    with open(file, 'wb') as f:
+        f.write(data)
+    expected = parse(plain, 1)
+    got = parse(file, workers)
+    assert len(got) == len(expected) > 0
+    for name in ('epoch', 'O2', 'tempC', 'offsets'):
+        assert (getattr(got, name) == getattr(expected, name)).all()
+
+def test_plain_file_is_parsed_in_ranges(plain):
+    parser = RawFileParse(plain, '16:38:30', '30/10/13', (10, 0), extract = False, workers = 2)
+    parser.CHUNK_SIZE = 1 << 14
+    called = []
+    read_ranges = parser.read_ranges
+    parser.read_ranges = lambda: called.append(True) or read_ranges()
+    data = parser.extract_data()
+    assert called and len(data) == len(parse(plain, 1))
@@ -0,0 +1,42 @@
+import pytest
+from numpy import abs as np_abs, arange
+from fishrespy import RawFileParse
+from synthData import write_raw
+
+#synthData closes start at 16:38:30 and every 20 minutes after, for 10 minutes
+FIRST = 1383151110
+CYCLE = 600
+
+@pytest.mark.parametrize('gap_rate', [0.01, 0.2])
+def test_detected_closes_start_at_the_true_start(tmp_path, gap_rate):
+    raw = str(tmp_path / 'raw.txt')
+    write_raw(raw, hours = 12, gap_rate = gap_rate)
+    data = RawFileParse(raw, None, None, (10, 0), detect = True).get_data()
+    true = FIRST + 2 * CYCLE * arange(12 * 3600 // (2 * CYCLE))
+    starts = data.epoch[data.offsets[:-1]]
+    assert len(starts) == len(true)
+    assert np_abs(starts - true).max() <= 8
+    #each close holds the samples of cycle_time from its start
+    ends = data.epoch[data.offsets[1:] - 1]
+    assert ((ends - starts) < CYCLE).all() and ((ends - starts) > CYCLE - 30).all()
+    assert data.start(0).startswith('30/10/13 16:38')
+
+def test_detect_finds_closes_the_schedule_loses_to_missing_lines(tmp_path):
+    raw = str(tmp_path / 'raw.txt')
+    write_raw(raw, hours = 12, gap_rate = 0.2)
+    scheduled = RawFileParse(raw, '16:38:30', '30/10/13', (10, 0)).get_data()
+    detected = RawFileParse(raw, '16:38:30', '30/10/13', (10, 0), detect = True).get_data()
+    assert len(scheduled) < len(detected) == 36
+
+def test_command_line_detect(tmp_path, monkeypatch, capsys):
+    import sys
+    import fishrespy
+    raw = str(tmp_path / 'raw.txt')
+    write_raw(raw, hours = 2, gap_rate = 0.2)
+    monkeypatch.setattr(sys, 'argv', ['fishrespy', raw, '-', '-', '10:00', '0.61', '5', '--detect'])
+    fishrespy.main()
+    lines = capsys.readouterr().out.splitlines()
+    starts = [line.split(',')[2] for line in lines[1:]]
+    assert len(starts) == 6
+    assert [s[:14] for s in starts] == ['30/10/13 16:38', '30/10/13 16:58', '30/10/13 17:18',
+                                        '30/10/13 17:38', '30/10/13 17:58', '30/10/13 18:18']
@@ -0,0 +1,43 @@
+import pytest
+from fishrespy import MO2Calculate
+from resultsModel import ResultsModel
+
+tkinter = pytest.importorskip('tkinter')
+
+@pytest.fixture
+def root():
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        pytest.skip('no display')
+    root.withdraw()
+    yield root
+    root.destroy()
+
+def rows(n = 100):
+    return [[-0.003 - 1e-5 * i, 0.99, '30/10/13 16:38:30', 0., 0.61, 15., 0.05] for i in range(n)]
+
+def test_edit_is_kept_when_scrolled_before_focus_out(root):
+    from displayData import DisplayData
+    model = ResultsModel(rows(), volume = 5.)
+    view = DisplayData(tkinter.Toplevel(root), model)
+    mass = view.header.index('mass') - 1
+    #focus the mass cell of the third row shown and type a new value
+    view.start_edit(2, mass)
+    view.cell_vals[(2, mass)].set('0.7')
+    view.yview('scroll', 10, 'units')
+    assert model.get(2, 'mass') == 0.7
+    assert model.get(2, 'MO2') == pytest.approx(MO2Calculate.O2consumption(model.get(2, 'slope'), 0.7, 5.))
+    #the cell now shows, and edits, the row scrolled into it
+    assert view.cell_vals[(2, mass)].get() == str(model.get(12, 'mass'))
+    assert view.editing == (2, mass, 12)
+
+def test_edit_is_kept_when_sorted(root):
+    from displayData import DisplayData
+    model = ResultsModel(rows(), volume = 5.)
+    view = DisplayData(tkinter.Toplevel(root), model)
+    mass = view.header.index('mass') - 1
+    view.start_edit(0, mass)
+    view.cell_vals[(0, mass)].set('0.8')
+    view.sort_by(0)
+    assert model.get(0, 'mass') == 0.8
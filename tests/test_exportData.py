@@ -0,0 +1,25 @@
+import sys
+import pytest
+import exportData
+from exportData import export, load_columns
+from fishrespy import RawFileParse, MO2Calculate
+from synthData import write_raw
+
+def test_export_round_trip(tmp_path):
+    raw = str(tmp_path / 'raw.txt')
+    write_raw(raw, hours = 2)
+    calc = MO2Calculate(RawFileParse(raw, '16:38:30', '30/10/13', (10, 0)).get_data(), 0.61, 5., (10, 0))
+    for output in (str(tmp_path / 'out.npz'), str(tmp_path / 'columns')):
+        export(calc, output)
+        columns = load_columns(output)
+        assert (columns['qc_O2'] == calc.qc_O2).all()
+
+@pytest.mark.parametrize('args, message', [(('16:38', '30/10/13', '10:00'), 'Time Error: Incorrect Start Time format'),
+                                           (('16:38:30', '30-10-13', '10:00'), 'Date Error: Incorrect Start Date format'),
+                                           (('16:38:30', '30/10/13', '10:75'), 'Cycle Error: Seconds must be less than 60')])
+def test_main_reports_bad_inputs(tmp_path, monkeypatch, capsys, args, message):
+    monkeypatch.setattr(sys, 'argv', ['exportData.py', 'raw.txt'] + list(args) + ['0.61', '5', str(tmp_path / 'out.npz')])
+    with pytest.raises(SystemExit) as e:
+        exportData.main()
+    assert e.value.code == 2
+    assert message in capsys.readouterr().err
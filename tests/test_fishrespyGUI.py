@@ -0,0 +1,26 @@
+import pytest
+
+tkinter = pytest.importorskip('tkinter')
+
+@pytest.fixture
+def root():
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        pytest.skip('no display')
+    root.withdraw()
+    yield root
+    root.destroy()
+
+def test_missing_file_shows_error(root, tmp_path, monkeypatch):
+    import fishrespyGUI
+    errors = []
+    monkeypatch.setattr(fishrespyGUI.messagebox, 'showerror', lambda title, message: errors.append(title))
+    gui = fishrespyGUI.MO2GUI(tkinter.Toplevel(root))
+    gui.file.set(str(tmp_path / 'missing.txt'))
+    gui.time.set('16:38:30')
+    gui.date.set('30/10/13')
+    gui.cycle_time.set('10:00')
+    gui.calculate()
+    assert errors == ['File Error']
+    assert gui.progress is None
@@ -0,0 +1,28 @@
+import os
+import csv
+import pytest
+from fishrespy import RawFileParse, MO2Calculate
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ExampleData')
+
+def test_results_match_list_based_version(tmp_path):
+    """synth_results.csv was written by the list based RawFileParse and MO2Calculate before the columnar rewrite"""
+    data = RawFileParse(os.path.join(EXAMPLE, 'synth_raw.txt'), '16:38:30', '30/10/13', (10, 0)).get_data()
+    calc = MO2Calculate(data, 0.61, 5, (10, 0))
+    out = str(tmp_path / 'results.csv')
+    calc.save_data(out)
+    with open(os.path.join(EXAMPLE, 'synth_results.csv')) as f:
+        expected = list(csv.reader(f))
+    with open(out) as f:
+        got = list(csv.reader(f))
+    assert got[0] == expected[0]
+    assert len(got) == len(expected) > 1
+    for row, want in zip(got[1:], expected[1:]):
+        assert row[2] == want[2]
+        assert [float(v) for v in row[:2] + row[3:]] == pytest.approx([float(v) for v in want[:2] + want[3:]],
+                                                                      rel = 1e-9, abs = 1e-12)
+    #the dictionary view of earlier versions
+    close = data[0]
+    assert sorted(close) == ['O2', 'date', 'tempC', 'time']
+    assert close['date'][0] == '30/10/13' and close['time'][0] == '16:38:30'
+    assert len(close['O2']) == data.offsets[1]
@@ -0,0 +1,115 @@
+import socket
+import asyncio
+import ingestService
+from synthData import write_raw
+from fishrespy import RawFileParse, MO2Calculate
+from ingestService import IngestService, replay
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def chamber(name, port):
+    return {'name': name, 'source': 'tcp://127.0.0.1:%d' % port, 'start_time': '16:38:30',
+            'start_date': '30/10/13', 'cycle_time': (10, 0), 'mass': 0.61, 'volume': 5.}
+
+def batch(raw):
+    data = RawFileParse(raw, '16:38:30', '30/10/13', (10, 0)).get_data()
+    return list(MO2Calculate(data, 0.61, 5., (10, 0)).get_data().values())
+
+def check_rows(rows, expected):
+    assert len(rows) == len(expected) > 0
+    for row, want in zip(rows, expected):
+        assert row[2] == want[2]
+        assert abs(row[3] - want[3]) < 1e-9 * abs(want[3])
+
+def collect(expected, names):
+    """Returns rows dict and on_row, which stops the service once every chamber in names has expected rows"""
+    rows = {}
+    service = []
+
+    def on_row(name, row):
+        rows.setdefault(name, []).append(row)
+        if all(len(rows.get(n, [])) >= expected for n in names):
+            service[0].stop()
+    return rows, on_row, service
+
+def test_refused_source_does_not_stop_other_chambers(tmp_path):
+    raw = str(tmp_path / 'raw.txt')
+    write_raw(raw, hours = 2)
+    expected = batch(raw)
+    good, refused = free_port(), free_port()
+    rows = {}
+
+    async def main():
+        server = asyncio.ensure_future(replay(raw, port = good, rate = 0))
+        await asyncio.sleep(0.2)
+        service = IngestService([chamber('refused', refused), chamber('good', good)],
+                                lambda name, row: rows.setdefault(name, []).append(row),
+                                retries = 2, backoff = 0.01)
+        run = asyncio.ensure_future(service.run())
+        try:
+            #stopped once the refused chamber is given up and the good one has every close
+            while not (service.tasks and service.tasks[0].done() and len(rows.get('good', [])) >= len(expected)):
+                await asyncio.sleep(0.01)
+            service.stop()
+            return await asyncio.wait_for(run, 30)
+        finally:
+            server.cancel()
+
+    failed = asyncio.run(main())
+    assert list(failed) == ['refused']
+    assert isinstance(failed['refused'], OSError)
+    assert 'refused' not in rows
+    check_rows(rows['good'], expected)
+
+def test_transmitter_restart_is_reconnected(tmp_path):
+    raw = str(tmp_path / 'raw.txt')
+    write_raw(raw, hours = 2)
+    expected = batch(raw)
+    port = free_port()
+    rows, on_row, service = collect(len(expected), ['restarts'])
+
+    async def main():
+        #the connection is closed every 1000 lines, as by a transmitter restarting
+        server = asyncio.ensure_future(replay(raw, port = port, rate = 0, drop = 1000))
+        await asyncio.sleep(0.2)
+        service.append(IngestService([chamber('restarts', port)], on_row, retries = 0, backoff = 0.01))
+        try:
+            return await asyncio.wait_for(service[0].run(), 30)
+        finally:
+            server.cancel()
+
+    assert asyncio.run(main()) == {}
+    check_rows(rows['restarts'], expected)
+
+def test_failures_count_again_after_a_connection(tmp_path, monkeypatch):
+    raw = str(tmp_path / 'raw.txt')
+    write_raw(raw, hours = 2)
+    expected = batch(raw)
+    with open(raw, 'rb') as f:
+        lines = f.readlines()
+    #every other open is refused, the others give the next part of the file
+    parts = [b''.join(lines[i:i + 1500]) for i in range(0, len(lines), 1500)]
+    opens = []
+
+    async def open_source(source):
+        opens.append(source)
+        if len(opens) % 2:
+            raise ConnectionRefusedError('refused')
+        reader = asyncio.StreamReader()
+        reader.feed_data(parts.pop(0) if parts else b'')
+        reader.feed_eof()
+        return reader, None
+
+    monkeypatch.setattr(ingestService, 'open_source', open_source)
+    rows, on_row, service = collect(len(expected), ['flaky'])
+
+    async def main():
+        service.append(IngestService([chamber('flaky', 0)], on_row, retries = 1, backoff = 0.01))
+        return await asyncio.wait_for(service[0].run(), 30)
+
+    assert asyncio.run(main()) == {}
+    assert len(opens) > 2 * 4
+    check_rows(rows['flaky'], expected)
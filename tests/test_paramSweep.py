@@ -0,0 +1,41 @@
+import sys
+import pytest
+import paramSweep
+from synthData import write_raw
+from paramSweep import ParamSweep
+from fishrespy import RawFileParse, MO2Calculate
+
+def test_main_reports_bad_inputs(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['paramSweep.py', 'raw.txt', str(tmp_path / 'out.csv'),
+                                      '--start-time', '16:38:30', '--start-date', '30/10/13',
+                                      '--cycle-time', '10:00', '10:75', '--mass', '0.61', '--volume', '5'])
+    with pytest.raises(SystemExit) as e:
+        paramSweep.main()
+    assert e.value.code == 2
+    assert 'Cycle Error: Seconds must be less than 60' in capsys.readouterr().err
+
+def write_shuffled(file):
+    """
+    Writes a synthData raw file with lines moved out of time order across the
+    end of some closes, as after a clock correction
+    """
+    write_raw(file, hours = 2)
+    with open(file, 'r') as f:
+        lines = f.readlines()
+    for end in ('16:48:28', '17:28:28', '18:08:28'):
+        i = [n for n, line in enumerate(lines) if '; %s;' % end in line][0]
+        lines[i], lines[i + 4] = lines[i + 4], lines[i]
+    with open(file, 'w') as f:
+        f.writelines(lines)
+
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_sweep_matches_a_plain_run(tmp_path, shuffle):
+    raw = str(tmp_path / 'raw.txt')
+    write_shuffled(raw) if shuffle else write_raw(raw, hours = 2)
+    expected = MO2Calculate(RawFileParse(raw, '16:38:30', '30/10/13', (10, 0)).get_data(), 0.61, 5., (10, 0)).get_data()
+    rows = ParamSweep(raw).grid(['16:38:30'], ['30/10/13'], [(10, 0)], [0.61], [5.])
+    assert len(rows) == len(expected) > 0
+    for row in rows:
+        want = expected[row[5]]
+        assert row[6:8] == want[0:2] and row[8] == want[2]
+        assert abs(row[9] - want[3]) < 1e-9 * abs(want[3])
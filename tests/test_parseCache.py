@@ -0,0 +1,45 @@
+import os
+import json
+from multiprocessing import Pool
+from numpy import arange, ones
+from parseCache import ParseCache
+
+def raw(folder, name, text = 'x'):
+    file = os.path.join(folder, name)
+    with open(file, 'w') as f:
+        f.write(text)
+    return file
+
+def store(args):
+    folder, file = args
+    n = 1000
+    ParseCache(folder).store(file, arange(n), ones(n), ones(n))
+
+def test_evict_sizes_folder_and_removes_orphans(tmp_path):
+    cache = ParseCache(str(tmp_path / 'cache'))
+    n = 10000
+    first = raw(str(tmp_path), 'a.txt', 'a')
+    cache.store(first, arange(n), ones(n), ones(n))
+    #an entry left by a crash before the index was written, not in the index
+    orphan = os.path.join(cache.folder, '0' * 32)
+    os.makedirs(orphan)
+    with open(os.path.join(orphan, 'O2.npy'), 'wb') as f:
+        f.write(b'\0' * (1 << 20))
+    cache.max_bytes = cache.size(os.path.join(cache.folder, cache.key(first))) * 2 + 1000
+    cache.store(raw(str(tmp_path), 'b.txt', 'b'), arange(n), ones(n), ones(n))
+    assert not os.path.exists(orphan)
+    assert cache.load(first) is not None
+    index = cache.read_index()
+    assert len(index) == 2
+    assert sum(e['bytes'] for e in index.values()) == sum(cache.entries().values()) <= cache.max_bytes
+
+def test_concurrent_stores_keep_every_entry(tmp_path):
+    folder = str(tmp_path / 'cache')
+    files = [raw(str(tmp_path), '%d.txt' % i, str(i)) for i in range(16)]
+    with Pool(4) as pool:
+        pool.map(store, [(folder, file) for file in files])
+    cache = ParseCache(folder)
+    with open(cache.index_file) as f:
+        index = json.load(f)
+    assert sorted(index) == sorted(cache.key(file) for file in files)
+    assert all(cache.load(file) is not None for file in files)
@@ -0,0 +1,25 @@
+import pytest
+from fishrespy import MO2Calculate
+from resultsModel import ResultsModel
+
+def model():
+    rows = [[-0.003, 0.99, '30/10/13 16:38:30', MO2, 0.61, 15., 0.05] for MO2 in (10., 12., 14., 12.)]
+    return ResultsModel(rows, volume = 5.)
+
+def test_row_given_twice_is_counted_once():
+    m = model()
+    #as parse_rows() gives for '1,1-2'
+    m.set_included([0, 0, 1], False)
+    assert m.summary()['included'] == 2
+    assert m.summary()['MO2'] == pytest.approx(13.)
+    m.set_included(slice(None), True)
+    assert m.summary()['MO2'] == pytest.approx(12.)
+    m.set_included([1, 1], False)
+    assert m.summary()['MO2'] == pytest.approx(12.)
+
+def test_set_row_given_twice():
+    m = model()
+    m.set('mass', [2, 0, 2], [1.22, 0.61, 0.])
+    assert m.column('mass').tolist() == [0.61, 0.61, 1.22, 0.61]
+    assert m.get(2, 'MO2') == pytest.approx(MO2Calculate.O2consumption(-0.003, 1.22, 5.))
+    assert m.summary()['cycles'] == 4
@@ -0,0 +1,56 @@
+import csv
+import pytest
+from numpy import array
+from fishrespy import RawFileParse, MO2Calculate
+from synthData import write_raw
+from batchRun import read_manifest
+from resultsStore import ResultsStore, to_epoch
+
+def calculate(raw):
+    data = RawFileParse(raw, '16:38:30', '30/10/13', (10, 0)).get_data()
+    return MO2Calculate(data, 0.61, 5., (10, 0))
+
+def test_round_trip(tmp_path):
+    raw = str(tmp_path / 'a.txt')
+    write_raw(raw, hours = 3)
+    write_raw(str(tmp_path / 'b.txt'), hours = 2, tempC = 20., seed = 1)
+    manifest = tmp_path / 'manifest.csv'
+    with open(str(manifest), 'w', newline = '') as f:
+        w = csv.writer(f)
+        w.writerow(['file', 'start_time', 'start_date', 'cycle_time', 'mass', 'volume', 'fish', 'chamber'])
+        w.writerow(['b.txt', '16:38:30', '30/10/13', '10:00', '0.61', '5', 'F2', '2'])
+    calc = calculate(raw)
+    db = str(tmp_path / 'results.db')
+    with ResultsStore(db) as store:
+        first = store.add(calc, raw, '16:38:30', '30/10/13', fish = 'F1', chamber = '1', samples = True)
+        second, = store.add_manifest(read_manifest(str(manifest)), workers = 1)
+
+    #read back from a new connection
+    with ResultsStore(db) as store:
+        experiments = store.experiments()
+        assert [(e['id'], e['fish'], e['chamber'], e['cycle_time']) for e in experiments] == \
+               [(first, 'F1', '1', 600), (second, 'F2', '2', 600)]
+        result = store.query(fish = 'F1')
+        output = list(calc.get_data().values())
+        assert result['cycle'].tolist() == list(range(len(output)))
+        assert result['start'].tolist() == [to_epoch(row[2]) for row in output]
+        for c, name in ((0, 'slope'), (1, 'R2'), (3, 'MO2'), (5, 'meanTemp'), (6, 'sdTemp')):
+            assert (result[name] == array([row[c] for row in output])).all()
+
+        cycle, epoch, O2, tempC = store.samples(first)
+        assert (epoch == calc.data.epoch).all() and (O2 == calc.data.O2).all() and (tempC == calc.data.tempC).all()
+        assert (store.samples(first, 1)[1] == calc.data.cycle(1)[0]).all()
+
+        #filters
+        assert set(store.query()['experiment'].tolist()) == {first, second}
+        assert set(store.query(min_temp = 18)['experiment'].tolist()) == {second}
+        assert len(store.query(chamber = ['1', '2'])['cycle']) == len(output) + len(store.query(fish = 'F2')['cycle'])
+        late = store.query(fish = 'F1', start = '30/10/13 17:30:00')
+        assert (late['start'] >= to_epoch('30/10/13 17:30:00')).all() and len(late['start']) < len(output)
+        R2 = store.query(min_R2 = 0.999)
+        assert (R2['R2'] >= 0.999).all()
+        assert len(store.query(fish = 'nobody')['MO2']) == 0
+
+        store.delete(first)
+        assert store.experiments(fish = 'F1') == []
+        assert len(store.samples(first)[0]) == 0
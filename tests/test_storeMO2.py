@@ -0,0 +1,11 @@
+from numpy import zeros
+from fishrespy import CycleData, MO2Calculate
+
+def test_no_cycles_leaves_empty_qc_attributes():
+    data = CycleData(zeros(0, dtype = 'int64'), zeros(0), zeros(0), [0])
+    calc = MO2Calculate(data, 0.61, 5., (10, 0))
+    assert calc.get_data() == {}
+    assert calc.qc_O2.shape == (0, 600)
+    assert len(calc.gaps) == 0 and len(calc.longest_gap) == 0
+    #the batch stages run on the empty arrays as they do with cycles
+    assert len(calc.fit_slopes(calc.qc_O2)[0]) == 0
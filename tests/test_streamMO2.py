@@ -0,0 +1,34 @@
+import sys
+import csv
+import pytest
+from fishrespy import MO2Calculate, RawFileParse
+from synthData import write_raw
+import streamMO2
+
+def run_main(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['streamMO2.py'] + list(args))
+    streamMO2.main()
+
+def test_main_rejects_bad_inputs(monkeypatch, capsys, tmp_path):
+    raw = str(tmp_path / 'raw.txt')
+    write_raw(raw, hours = 1)
+    for args, message in [(('16:38', '30/10/13', '10:00'), 'Incorrect Start Time format, Requires HH:MM:SS'),
+                          (('16:38:30', '30-10-13', '10:00'), 'Incorrect Start Date format, Requires dd/mm/yy'),
+                          (('16:38:30', '30/10/13', '10'), 'Incorrect separator in Cycle Time'),
+                          (('16:38:30', '30/10/13', '10:75'), 'Seconds must be less than 60')]:
+        with pytest.raises(SystemExit) as e:
+            run_main(monkeypatch, raw, *args, '0.61', '5')
+        assert e.value.code == 2
+        assert message in capsys.readouterr().err
+
+def test_main_matches_batch_output(monkeypatch, capsys, tmp_path):
+    raw = str(tmp_path / 'raw.txt')
+    write_raw(raw, hours = 2)
+    run_main(monkeypatch, raw, '16:38:30', '30/10/13', '10:00', '0.61', '5', '--idle', '0')
+    rows = list(csv.reader(capsys.readouterr().out.splitlines()))
+    calc = MO2Calculate(RawFileParse(raw, '16:38:30', '30/10/13', (10, 0)).get_data(), 0.61, 5., (10, 0))
+    assert rows[0] == calc.columns
+    assert len(rows) - 1 == len(calc.get_data()) > 0
+    for line, expected in zip(rows[1:], calc.get_data().values()):
+        assert line[2] == expected[2]
+        assert float(line[3]) == pytest.approx(expected[3])
@@ -0,0 +1,62 @@
+import pytest
+from numpy import random, percentile, sort
+from summaryStats import Moments, QuantileSketch, MO2Summary
+
+def rows(n, seed):
+    rng = random.RandomState(seed)
+    MO2 = rng.lognormal(4, 0.5, n)
+    R2 = rng.uniform(0.8, 1., n)
+    temp = rng.normal(15, 0.3, n)
+    return [[-0.003, r, 'close %d %d' % (seed, i), m, 0.61, t, 0.05] for i, (r, m, t) in enumerate(zip(R2, MO2, temp))]
+
+def test_merged_parts_equal_one_pass():
+    parts = [rows(n, seed) for seed, n in enumerate([1, 500, 37, 2000, 0])]
+    everything = [row for part in parts for row in part]
+    single = MO2Summary(min_R2 = (0.9, 0.95), k = 5)
+    single.add_rows(everything)
+    merged = MO2Summary(min_R2 = (0.9, 0.95), k = 5)
+    for part in parts:
+        summary = MO2Summary(min_R2 = (0.9, 0.95), k = 5)
+        summary.add_rows(part)
+        merged.merge(summary)
+    a, b = single.result(), merged.result()
+    assert a.keys() == b.keys() == {'all', 'R2>=0.9', 'R2>=0.95'}
+    for group in a:
+        for name, value in a[group].items():
+            if isinstance(value, float):
+                assert b[group][name] == pytest.approx(value, rel = 1e-12), (group, name)
+            else:
+                assert b[group][name] == value, (group, name)
+    MO2 = sort([row[3] for row in everything])
+    assert a['all']['n'] == len(MO2)
+    assert a['all']['mean'] == pytest.approx(MO2.mean())
+    assert a['all']['sd'] == pytest.approx(MO2.std(ddof = 1))
+    assert a['all']['meanLowest'] == pytest.approx(MO2[:5].mean())
+    assert a['all']['MMR'] == MO2[-1]
+
+def test_moments_merge_matches_numpy():
+    values = random.RandomState(0).normal(1e6, 1., 10000)
+    m = Moments()
+    for part in (values[:3], values[3:5000], values[5000:]):
+        other = Moments()
+        other.add(part)
+        m.merge(other)
+    assert m.mean == pytest.approx(values.mean(), rel = 1e-14)
+    assert m.sd() == pytest.approx(values.std(ddof = 1), rel = 1e-9)
+
+@pytest.mark.parametrize('accuracy', [0.01, 0.05])
+def test_quantiles_within_relative_error(accuracy):
+    rng = random.RandomState(1)
+    values = rng.lognormal(4, 1., 20000) * rng.choice([-1, 1], 20000, p = [0.1, 0.9])
+    sketch = QuantileSketch(accuracy)
+    for part in (values[:7000], values[7000:]):
+        other = QuantileSketch(accuracy)
+        other.add(part)
+        sketch.merge(other)
+    for q in (0.01, 0.05, 0.1, 0.2, 0.5, 0.9, 0.99):
+        #the sketch returns the value at rank q * (n - 1), as percentile 'lower'
+        true = percentile(values, q * 100, method = 'lower')
+        assert abs(sketch.quantile(q) - true) <= accuracy * abs(true) * (1 + 1e-12), q
+    assert sketch.quantile(0) == values.min() and sketch.quantile(1) == values.max()
+    with pytest.raises(ValueError):
+        sketch.merge(QuantileSketch(accuracy * 2))
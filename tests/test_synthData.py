@@ -0,0 +1,29 @@
+import filecmp
+from numpy import diff
+from fishrespy import RawFileParse
+from synthData import write_raw
+
+def test_default_flush_is_cycle_time(tmp_path):
+    write_raw(str(tmp_path / 'default.txt'), hours = 2)
+    write_raw(str(tmp_path / 'flush.txt'), hours = 2, flush = 600)
+    assert filecmp.cmp(str(tmp_path / 'default.txt'), str(tmp_path / 'flush.txt'), shallow = False)
+
+def test_closes_follow_flush(tmp_path):
+    raw = str(tmp_path / 'raw.txt')
+    write_raw(raw, hours = 3, cycle_time = (10, 0), flush = 180)
+    epoch, O2, tempC = RawFileParse(raw, None, None, (10, 0), extract = False).read_samples()
+    first = epoch[0] + 300
+    assert first % 86400 == 16 * 3600 + 38 * 60 + 30
+    #O2 falls through each close and recovers through the flush after it
+    for start in range(first, epoch[-1] - 780, 780):
+        for begin, end, falls in ((start, start + 600, True), (start + 600, start + 780, False)):
+            part = O2[(epoch >= begin) & (epoch < end)]
+            assert (part[:20].mean() > part[-20:].mean()) == falls
+
+def test_detected_closes_follow_flush(tmp_path):
+    raw = str(tmp_path / 'raw.txt')
+    write_raw(raw, hours = 3, cycle_time = (10, 0), flush = 180)
+    data = RawFileParse(raw, None, None, (10, 0), detect = True).get_data()
+    starts = data.epoch[data.offsets[:-1]]
+    assert len(starts) >= 12
+    assert (abs(diff(starts) - 780) <= 10).all()
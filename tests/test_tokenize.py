@@ -0,0 +1,99 @@
+import pytest
+from numpy import random
+from fishrespy import RawFileParse
+from synthData import write_raw
+
+START = ('16:38:30', '30/10/13', (10, 0))
+
+def damage(line, rng):
+    """Returns line broken in one of the ways seen in real raw files"""
+    kind = rng.randint(8)
+    if kind == 0:
+        return line[:rng.randint(1, len(line) - 1)]
+    if kind == 1:
+        return line.replace('.', ',', 2)
+    if kind == 2:
+        return line.replace('; ', ';  ', 1)
+    if kind == 3:
+        return line[:10] + '25' + line[12:]
+    if kind == 4:
+        return '31/02/13' + line[8:]
+    if kind == 5:
+        return line[:25] + 'x' + line[26:]
+    if kind == 6:
+        return ''
+    return 'Date; Time; LogTime [min]; Oxygen [mg/L]; Phase [deg]; Amp; Temp [C]; Error;'
+
+def write_messy(file, hours = 3):
+    """
+    Writes a synthData raw file with CRLF endings on some lines, damaged and
+    header lines among the data and no newline after the last line.
+    """
+    write_raw(file, hours = hours)
+    rng = random.RandomState(1)
+    with open(file, 'r') as f:
+        lines = f.read().splitlines()
+    out = []
+    for line in lines:
+        if rng.random_sample() < 0.02:
+            out.append(damage(line, rng))
+        out.append(line)
+    ends = ['\r\n' if crlf else '\n' for crlf in rng.random_sample(len(out)) < 0.3]
+    text = ''.join(line + end for line, end in zip(out, ends))
+    with open(file, 'w', newline = '') as f:
+        f.write(text.rstrip('\r\n'))
+
+def reference(file):
+    """Samples of file from the per line regex parse, the parse used before tokenize()"""
+    parser = RawFileParse(file, *START, extract = False)
+    with open(file, 'rb') as f:
+        return parser.parse_lines(f.read())
+
+@pytest.fixture(scope = 'module')
+def messy(tmp_path_factory):
+    file = str(tmp_path_factory.mktemp('raw') / 'messy.txt')
+    write_messy(file)
+    return file, reference(file)
+
+@pytest.mark.parametrize('chunk_size, small_block', [(1 << 22, 16), (4093, 16), (1000, 16), (700, 0)])
+def test_tokenizer_matches_regex(messy, chunk_size, small_block):
+    file, expected = messy
+    parser = RawFileParse(file, *START, extract = False)
+    parser.CHUNK_SIZE = chunk_size
+    parser.SMALL_BLOCK = small_block
+    samples = parser.read_samples()
+    for got, want in zip(samples, expected):
+        assert got.dtype == want.dtype
+        assert (got == want).all()
+    assert parser.bin_samples(samples[0]) == parser.bin_samples(expected[0])
+    assert len(parser.bin_samples(samples[0])) > 5
+
+def test_messy_file_has_every_kind_of_damage(messy):
+    file, expected = messy
+    with open(file, 'rb') as f:
+        data = f.read()
+    assert b'\r\n' in data and not data.endswith(b'\n')
+    #damaged lines are dropped, not parsed as samples
+    assert len(expected[0]) < data.count(b'\n')
+
+def test_byte_ranges_read_back_the_whole_file(messy):
+    file, expected = messy
+    parser = RawFileParse(file, *START, extract = False)
+    parser.CHUNK_SIZE = 997
+    with open(file, 'rb') as f:
+        data = f.read()
+    ranges = parser.split_file(7)
+    assert len(ranges) == 7
+    chunks = [list(parser.read_chunks(start, end)) for start, end in ranges]
+    assert b''.join(b''.join(c) for c in chunks) == data
+    #every block ends on a line boundary, only the last line of the file has no newline
+    blocks = [block for c in chunks for block in c]
+    assert all(block.endswith(b'\n') for block in blocks[:-1])
+
+def test_parallel_parse_matches_regex(messy):
+    file, expected = messy
+    parser = RawFileParse(file, *START, extract = False, workers = 2)
+    parser.CHUNK_SIZE = 4093
+    samples = parser.read_samples()
+    for got, want in zip(samples, expected):
+        assert (got == want).all()
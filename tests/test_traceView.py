@@ -0,0 +1,42 @@
+import sys
+import pytest
+import traceView
+from numpy import arange, ceil, diff, random
+from traceView import minmax, TraceView
+
+@pytest.mark.parametrize('n, buckets', [(1003, 10), (1800, 496), (100000, 997)])
+def test_minmax_spreads_points_over_the_whole_trace(n, buckets):
+    x = arange(n)
+    y = random.RandomState(0).normal(0, 1, n)
+    #the largest and smallest values are in the last few samples
+    y[-2] = 10.
+    y[-1] = -10.
+    xs, ys = minmax(x, y, buckets)
+    assert len(ys) == 2 * buckets
+    assert (diff(xs) >= 0).all()
+    assert ys.max() == 10. and ys.min() == -10.
+    assert (y[xs] == ys).all()
+    #no stretch of the trace is left out, points are at most two runs apart
+    assert diff(xs).max() < 2 * ceil(n / buckets)
+    assert xs[0] < ceil(n / buckets) and xs[-1] == n - 1
+
+def test_dates_are_converted_when_plotted():
+    pytest.importorskip('matplotlib')
+    import matplotlib
+    matplotlib.use('Agg')
+    from fishrespy import CycleData
+    epoch = 1383151110 + arange(5000)
+    y = random.RandomState(0).normal(9, 0.1, 5000)
+    view = TraceView((epoch, y, y), CycleData(epoch[:0], y[:0], y[:0], [0]), (10, 0))
+    assert view.num is None
+    view.createPlot()
+    assert len(view.num) == 5000
+    x = view.O2_line.get_xdata()
+    assert x[0] >= view.num[0] and x[-1] <= view.num[-1]
+
+def test_main_reports_bad_inputs(monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['traceView.py', 'raw.txt', '16:38:30', '30/10/13', '10:75'])
+    with pytest.raises(SystemExit) as e:
+        traceView.main()
+    assert e.value.code == 2
+    assert 'Cycle Error: Seconds must be less than 60' in capsys.readouterr().err
@@ -0,0 +1,24 @@
+import pytest
+from datetime import datetime
+from numpy import arange, random
+from fishrespy import CycleData, MO2Calculate
+
+def test_best_window_temp_is_from_the_window_samples():
+    n = 600
+    sec = arange(n)
+    noise = random.RandomState(0).normal(0, 0.05, n)
+    #noisy for the first 400 s, a clean line after, so the best window is late in the close
+    O2 = 9. - 0.003 * sec + noise * (sec < 400)
+    tempC = 10. + 0.01 * sec
+    epoch = 1383151110 + sec
+    calc = MO2Calculate(CycleData(epoch, O2, tempC, [0, n]), 0.61, 5., (10, 0))
+    slope, R2, start, MO2, mass, meanTemp, sdTemp = calc.best_windows(100, skip = 60)[0]
+
+    first = datetime.strptime(start, CycleData.DATETIME_FORMAT) - CycleData.EPOCH
+    offset = int(first.total_seconds()) - epoch[0]
+    assert offset >= 399
+    window = tempC[offset:offset + 100]
+    assert meanTemp == pytest.approx(window.mean())
+    assert sdTemp == pytest.approx(window.std())
+    #the whole close temp is well away from the window on this ramp
+    assert abs(meanTemp - tempC.mean()) > 1